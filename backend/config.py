@@ -14,6 +14,7 @@ MODAL_UPDATE_CODE_FUNCTION_NAME = "update_code"
 MODAL_SETUP_PROJECT_FUNCTION_NAME = "setup_project"
 MODAL_DEPLOY_PROJECT_FUNCTION_NAME = "deploy_project"
 MODAL_POLL_BUILD_FUNCTION_NAME = "poll_build_status"
+MODAL_REPLY_TO_CAST_FUNCTION_NAME = "reply_to_cast_with_project"
 
 TIMEOUTS = {
     "CODE_UPDATE": 1200,  # 20 mins
@@ -33,9 +34,126 @@ PATHS = {
     "PNPM_STORE": "/pnpm-store",
 }
 
+SUPABASE_HTTP = {
+    "MAX_CONNECTIONS": 20,
+    "MAX_KEEPALIVE_CONNECTIONS": 10,
+    "KEEPALIVE_EXPIRY": 60,  # seconds an idle connection stays open for reuse
+    "TIMEOUT": 120,
+}
+
+LOG_BUFFER = {
+    "MAX_BATCH_SIZE": 50,  # flush once this many log rows are queued
+    "FLUSH_INTERVAL": 2.0,  # seconds, max time a log row waits in memory
+    "MAX_PENDING": 1000,  # rows kept for retry when a flush fails
+}
+
+PROCESS_OUTPUT = {
+    "MAX_LINES": 2000,  # lines of sandbox process output kept in memory, older lines are dropped
+}
+
+KV = {
+    # seconds, every Redis use is best effort and must not hang the caller
+    "SOCKET_TIMEOUT": 5,
+    "SOCKET_CONNECT_TIMEOUT": 3,
+}
+
+WEBHOOK_DEDUP = {
+    "TTL": 60 * 60,  # seconds a cast hash is remembered, covers Neynar's retry window
+}
+
+ADMISSION = {
+    "ENABLED": True,
+    # token buckets, each request takes one token from the user's bucket and the global one
+    "USER_BUCKET": {"CAPACITY": 5, "REFILL_PER_HOUR": 10},
+    "GLOBAL_BUCKET": {"CAPACITY": 60, "REFILL_PER_HOUR": 240},
+    "MAX_ACTIVE_JOBS": 25,  # setup_project and update_code runs in flight at once
+    "QUEUE_FULL_RETRY_AFTER": 60,  # seconds clients are asked to wait when all job slots are taken
+}
+
+PROJECT_LOCK = {
+    "LEASE": 120,  # seconds a crashed job keeps its project locked, renewed while the job runs
+    "WAIT_TIMEOUT": 30 * 60,  # seconds a job waits for earlier jobs on the same project
+    "POLL_INTERVAL": 2,
+}
+
+UPDATE_CODE_QUEUE = {
+    "ENABLED": True,
+    "DEBOUNCE_WINDOW": 15,  # seconds without a new prompt before a project's queued prompts run
+    "MAX_DEBOUNCE_WAIT": 60,  # seconds a run waits for a busy user to pause
+}
+
+REPO_CACHE = {
+    "ENABLED": True,
+    "MAX_DISK_BYTES": 5 * 1024**3,  # 5 GB of cached working copies on the volume
+    "LOCK_TIMEOUT": 60,  # seconds to wait for a busy working copy before cloning fresh
+}
+
+DEPENDENCY_IMAGE_CACHE = {
+    "ENABLED": True,
+    "DICT_NAME": "frameception-dependency-images",
+    "VERSION": 1,  # bump when base_image changes so old snapshots are not reused
+    "MAX_AGE": 7 * 24 * 3600,  # seconds
+}
+
+SANDBOX_POOL = {
+    "SIZE": 1,  # idle warm sandboxes kept per dependency image
+    "TTL": 1800,  # seconds before a sandbox is recycled instead of reused
+    "IDLE_TIMEOUT": 600,  # Modal terminates a sandbox left idle this long
+    # start a replacement in the background whenever one is leased, only pays off in
+    # containers that run several jobs, single-job containers would pay for an unused sandbox
+    "PREWARM": False,
+    "CPU": 2,
+    "MEMORY": 1024,
+}
+
 CODE_CONTEXT = {
     "ENABLED": True,
     "MIN_RAG_SCORE": 0.49,
+    "TOP_K": 2,  # doc nodes retrieved per search query
+    "MAX_CONTEXT_NODES": 6,  # doc nodes kept after fusing the results of all search queries
+    "EMBEDDING_DTYPE": "float16",  # storage precision of the compact docs vector store
+}
+
+LLM_HTTP = {
+    "MAX_CONNECTIONS": 50,
+    "MAX_KEEPALIVE_CONNECTIONS": 20,
+    "KEEPALIVE_EXPIRY": 120,  # seconds, long enough to span the gap between spec, plan and todo calls
+    "HTTP2": True,  # used when the h2 package is installed
+}
+
+LLM_CACHE = {
+    "ENABLED": True,
+    "TTL": 7 * 24 * 60 * 60,  # seconds a cached completion is served
+    "MAX_ENTRIES": 5000,  # oldest completions are dropped beyond this
+    "SEMANTIC_THRESHOLD": 0.97,  # min cosine similarity to reuse the answer to a different prompt
+    "MAX_SEMANTIC_CANDIDATES": 100,  # newest prompts per system prompt and params compared on a semantic lookup
+    "EMBEDDING_MODEL": "text-embedding-3-small",
+    "EMBEDDING_TIMEOUT": 5.0,  # seconds, semantic lookups sit on latency-bound paths
+}
+
+LLM_ROUTER = {
+    "WINDOW": 50,  # most recent calls per provider/model used for latency and error stats
+    "MIN_SAMPLES": 5,  # calls needed before a route's latency and error rate are trusted
+    "MAX_ERROR_RATE": 0.5,  # routes failing more often than this are only used as a last resort
+    "HEDGE": True,  # send a second request to the next route if the first is slower than its p95
+    "ROUTES": {
+        # (provider, model) in order of preference until latency data says otherwise
+        "reasoning": {
+            "models": [("deepseek", "deepseek-reasoner"), ("together", "deepseek-ai/DeepSeek-R1")],
+            "hedge_after": 240,  # seconds, used while the route has too few samples for a p95
+        },
+        "chat": {
+            "models": [("deepseek", "deepseek-chat"), ("together", "deepseek-ai/DeepSeek-V3")],
+            "hedge_after": 20,
+        },
+    },
+}
+
+QUERY_EXPANSION = {
+    "MODEL": "deepseek-chat",  # low latency chat model, never a reasoning model
+    "MAX_TOKENS": 120,
+    "TIMEOUT": 6.0,  # seconds before falling back to local keyword extraction
+    "MAX_QUERIES": 3,
 }
 
 AIDER_CONFIG = {
@@ -73,6 +73,28 @@ class GitPushError(GitError):
             original_exception
         )
 
+class ProjectLockError(CodeServiceError):
+    """Base exception for per-project job lock errors"""
+    pass
+
+class ProjectLockTimeoutError(ProjectLockError):
+    """Another job held the project for longer than we were willing to wait"""
+    def __init__(self, job_id: Optional[str], project_id: str, timeout: float):
+        super().__init__(
+            f"Timed out after {timeout}s waiting for another job on the project",
+            job_id,
+            project_id,
+        )
+
+class ProjectLockLostError(ProjectLockError):
+    """The lease expired and the project may already belong to a newer job"""
+    def __init__(self, job_id: Optional[str], project_id: str, token: int):
+        super().__init__(
+            f"Lost project lock with fencing token {token}",
+            job_id,
+            project_id,
+        )
+
 class BuildError(CodeServiceError):
     """Base exception for build process errors"""
     pass
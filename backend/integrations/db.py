@@ -1,22 +1,175 @@
 import os
+import atexit
+import threading
 from typing import Optional
 import uuid
 from datetime import datetime
 
+from backend import config
 
-class Database:
-    def __init__(self):
-        from supabase import create_client
 
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_API_KEY")
-        if not url or not key:
-            raise RuntimeError(
-                "Supabase credentials not configured. "
-                "Ensure you've added the supabase-secret to your Modal function."
-            )
+class LogBuffer:
+    """Queues log rows in memory and writes them to Supabase as bulk inserts.
+
+    A background thread flushes the queue once MAX_BATCH_SIZE rows are pending
+    or FLUSH_INTERVAL seconds have passed, so callers never wait on the network.
+    Call flush() at job end or on error to write everything that is still queued.
+    """
+
+    def __init__(
+        self,
+        client,
+        table: str = "logs",
+        max_batch_size: int = config.LOG_BUFFER["MAX_BATCH_SIZE"],
+        flush_interval: float = config.LOG_BUFFER["FLUSH_INTERVAL"],
+        max_pending: int = config.LOG_BUFFER["MAX_PENDING"],
+    ):
+        self.client = client
+        self.table = table
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._entries: list[dict] = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+        atexit.register(self.flush)
+
+    def add(self, entry: dict):
+        """Queue a row for the next bulk insert"""
+        with self._condition:
+            self._entries.append(entry)
+            self._ensure_worker()
+            if len(self._entries) >= self.max_batch_size:
+                self._condition.notify()
+
+    def flush(self) -> int:
+        """Write all queued rows in one insert. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._condition:
+                entries, self._entries = self._entries, []
+            if not entries:
+                return 0
+
+            try:
+                self.client.table(self.table).insert(entries).execute()
+                return len(entries)
+            except Exception as e:
+                print(f"[db] Failed to flush {len(entries)} log entries: {e}")
+                with self._condition:
+                    # keep the oldest rows first so retries preserve ordering
+                    self._entries = (entries + self._entries)[-self.max_pending:]
+                return 0
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._entries)
+
+    def _ensure_worker(self):
+        if self._worker and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(
+            target=self._run, name=f"{self.table}-log-buffer", daemon=True
+        )
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._entries) >= self.max_batch_size,
+                    timeout=self.flush_interval,
+                )
+            self.flush()
+
+
+# Supabase clients are shared by every Database() in the container, keyed by credentials
+_client_registry: dict[tuple[str, str], tuple] = {}
+_client_registry_lock = threading.Lock()
+_connection_stats = {
+    "clients_created": 0,
+    "clients_reused": 0,
+    "requests": 0,
+    "connections_opened": 0,
+}
+_connection_stats_lock = threading.Lock()
+
+
+def _count_connection_stat(name: str):
+    with _connection_stats_lock:
+        _connection_stats[name] += 1
+
+
+def _trace_http_request(request):
+    """httpx request hook: count requests and the TCP connects they trigger"""
+    _count_connection_stat("requests")
+
+    def trace(event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            _count_connection_stat("connections_opened")
+
+    request.extensions["trace"] = trace
+
+
+def _create_http_client():
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=config.SUPABASE_HTTP["MAX_CONNECTIONS"],
+            max_keepalive_connections=config.SUPABASE_HTTP["MAX_KEEPALIVE_CONNECTIONS"],
+            keepalive_expiry=config.SUPABASE_HTTP["KEEPALIVE_EXPIRY"],
+        ),
+        timeout=config.SUPABASE_HTTP["TIMEOUT"],
+        event_hooks={"request": [_trace_http_request]},
+    )
+
+
+def get_supabase_client():
+    """Get the container-wide Supabase client and its log buffer, creating them on first use"""
+    from supabase import create_client, ClientOptions
+
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_API_KEY")
+    if not url or not key:
+        raise RuntimeError(
+            "Supabase credentials not configured. "
+            "Ensure you've added the supabase-secret to your Modal function."
+        )
 
-        self.client = create_client(url, key)
+    with _client_registry_lock:
+        entry = _client_registry.get((url, key))
+        if entry:
+            _count_connection_stat("clients_reused")
+            return entry
+
+        client = create_client(
+            url,
+            key,
+            options=ClientOptions(
+                httpx_client=_create_http_client(),
+                postgrest_client_timeout=config.SUPABASE_HTTP["TIMEOUT"],
+            ),
+        )
+        entry = (client, LogBuffer(client))
+        _client_registry[(url, key)] = entry
+        _count_connection_stat("clients_created")
+        return entry
+
+
+def get_connection_stats() -> dict:
+    """Snapshot of shared client usage, e.g. to check keep-alive reuse"""
+    with _connection_stats_lock:
+        stats = dict(_connection_stats)
+    stats["connections_reused"] = max(stats["requests"] - stats["connections_opened"], 0)
+    return stats
+
+
+class Database:
+    def __init__(self):
+        self.client, self.log_buffer = get_supabase_client()
 
     def create_project(
         self, fid_owner: int, repo_url: str, frontend_url: str, data: dict = {}
@@ -64,33 +217,23 @@ class Database:
         return job_id
 
     def update_job_status(self, job_id: str, status: str, error: Optional[str] = None):
-        """Update job status"""
+        """Update job status, merging the error into job data server-side"""
         print(
             f"updating job {job_id}: status={status}, error={
                 error if error else 'None'
             }"
         )
-        new_job = {"status": status}
-
-        existing_job = (
-            self.client.table("jobs")
-            .select("data")
-            .eq("id", job_id)
-            .single()
-            .execute()
-            .data
-        )
-        existing_data = existing_job.get("data", {}) if existing_job else {}
-        if error:
-            merged_data = {**existing_data, "error": error}
-            new_job["data"] = merged_data
-
-        self.client.table("jobs").update(new_job).eq("id", job_id).execute()
+        # logs written before a status change should be visible alongside it
+        self.flush_logs()
+        self.client.rpc(
+            "set_job_status",
+            {"p_job_id": job_id, "p_status": status, "p_error": error},
+        ).execute()
 
     def add_log(self, job_id: str, source: str, text: str):
-        """Add a log entry"""
+        """Queue a log entry, written in bulk by the log buffer"""
         print(f"[{source}] {text}")
-        self.client.table("logs").insert(
+        self.log_buffer.add(
             {
                 "id": str(uuid.uuid4()),
                 "created_at": datetime.utcnow().isoformat(),
@@ -98,7 +241,11 @@ class Database:
                 "source": source,
                 "text": text,
             }
-        ).execute()
+        )
+
+    def flush_logs(self):
+        """Write all queued log entries now"""
+        self.log_buffer.flush()
 
     def get_project(self, project_id: str):
         """Get project details"""
@@ -171,20 +318,10 @@ class Database:
         print(
             f"Updating build {build_id}: status={status}, error={'None' if not error else error}"
         )
-        update_data = {"status": status}
-
-        if error:
-            existing_data = (
-                self.client.table("builds")
-                .select("data")
-                .eq("id", build_id)
-                .single()
-                .execute()
-                .data.get("data", {})
-            )
-            update_data["data"] = {**existing_data, "error": error}
-
-        self.client.table("builds").update(update_data).eq("id", build_id).execute()
+        self.client.rpc(
+            "set_build_status",
+            {"p_build_id": build_id, "p_status": status, "p_error": error},
+        ).execute()
 
     def add_build_log(self, build_id: str, source: str, text: str):
         """Add a build log entry"""
@@ -232,10 +369,22 @@ class Database:
         )
         return result.data if result else None
         
-    def get_latest_build(self, project_id: str):
-        """Get the latest build for a project"""
-        builds = self.get_builds_by_project(project_id)
-        return builds[0] if builds else None
+    def get_latest_build(self, project_id: str, columns: str = "*"):
+        """Get the latest build for a project, selecting only the given columns"""
+        result = (
+            self.client.table("builds")
+            .select(columns)
+            .eq("project_id", project_id)
+            .order("created_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return result.data[0] if result.data else None
+
+    def get_latest_build_logs(self, project_id: str) -> Optional[str]:
+        """Get only the logs of the latest build for a project"""
+        build = self.get_latest_build(project_id, columns="id, logs:data->>logs")
+        return build.get("logs") if build else None
 
     def update_build(self, build_id: str, update_data: dict):
         """Update build"""
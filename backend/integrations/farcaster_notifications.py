@@ -1,24 +1,15 @@
-import os
 import uuid
 import requests
-import redis
 from pydantic import BaseModel
 from typing import Optional, List
 
 from backend import config
+from backend.integrations.kv import get_redis_client
 
-KV_REST_API_URL = os.getenv("KV_REST_API_URL", "")
-KV_REST_API_TOKEN = os.getenv("KV_REST_API_TOKEN", "")
 FRONTEND_URL = config.FRONTEND_URL
 
 
-r = redis.Redis(
-    host=KV_REST_API_URL.replace("https://", ""),
-    password=KV_REST_API_TOKEN,
-    port=6379,
-    ssl=True,
-    decode_responses=True,
-)
+r = get_redis_client()
 
 
 class FrameNotificationDetails(BaseModel):
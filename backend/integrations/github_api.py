@@ -16,8 +16,8 @@ def get_github_instance():
     return Github(os.environ["GITHUB_TOKEN"])
 
 
-def clone_repo_url_to_dir(repo_url: str, dir_path: str):
-    """Clone a GitHub repository to a directory"""
+def get_authenticated_repo_url(repo_url: str) -> str:
+    """Build the token-authenticated .git URL for a GitHub repository"""
     # Ensure URL starts with https://github.com/
     if repo_url.startswith("github.com/"):
         repo_url = f"https://{repo_url}"
@@ -34,7 +34,12 @@ def clone_repo_url_to_dir(repo_url: str, dir_path: str):
     if not auth_url.endswith(".git"):
         auth_url += ".git"
 
-    return git.Repo.clone_from(auth_url, dir_path)
+    return auth_url
+
+
+def clone_repo_url_to_dir(repo_url: str, dir_path: str):
+    """Clone a GitHub repository to a directory"""
+    return git.Repo.clone_from(get_authenticated_repo_url(repo_url), dir_path)
 
 
 def configure_git_user_for_repo(repo: git.Repo):
@@ -146,3 +151,5 @@ class GithubApi:
             #     self.repo.delete()
             #     self.db.add_log(self.job_id, "github", "Cleaned up failed repo")
             raise
+        finally:
+            self.db.flush_logs()
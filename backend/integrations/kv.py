@@ -0,0 +1,129 @@
+"""
+Shared Redis (Upstash KV) connection
+"""
+import functools
+import os
+import time
+
+import redis
+
+from backend.config import KV
+
+
+def is_kv_configured() -> bool:
+    return bool(os.getenv("KV_REST_API_URL") and os.getenv("KV_REST_API_TOKEN"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    """One client (and connection pool) per container, connections are opened lazily"""
+    return redis.Redis(
+        host=os.getenv("KV_REST_API_URL", "").replace("https://", ""),
+        password=os.getenv("KV_REST_API_TOKEN", ""),
+        port=6379,
+        ssl=True,
+        decode_responses=True,
+        socket_timeout=KV["SOCKET_TIMEOUT"],
+        socket_connect_timeout=KV["SOCKET_CONNECT_TIMEOUT"],
+    )
+
+
+def claim_once(key: str, ttl: int) -> bool:
+    """Atomically mark key as seen for ttl seconds, True only for the first caller.
+
+    Fails open: if Redis is unreachable every caller gets True.
+    """
+    try:
+        return bool(get_redis_client().set(key, "1", nx=True, ex=ttl))
+    except Exception as e:
+        print(f"[kv] failed to claim {key}, processing anyway: {e}")
+        return True
+
+
+def release_claim(key: str):
+    """Forget a claim so a retried delivery is processed again"""
+    try:
+        get_redis_client().delete(key)
+    except Exception as e:
+        print(f"[kv] failed to release {key}: {e}")
+
+
+# Refills every bucket in KEYS and takes one token from each, but only if all of them have one.
+# ARGV is now, then capacity and refill rate (tokens per second) for each key.
+# Returns {1, 0} when the tokens were taken, else {0, seconds until every bucket has a token}.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        retry_after = math.max(retry_after, (1 - tokens) / rate)
+    end
+end
+if retry_after > 0 then
+    return {0, tostring(retry_after)}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'updated_at', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {1, '0'}
+"""
+
+# Adds ARGV[4] to the set of in-flight jobs in KEYS[1] unless it already holds ARGV[3] jobs.
+# Entries older than ARGV[2] seconds belong to jobs that died without releasing their slot.
+ACQUIRE_SLOT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+return 1
+"""
+
+
+def take_tokens(buckets: dict[str, tuple[float, float]]) -> float:
+    """Take one token from every bucket, keyed by name with (capacity, refill per second).
+
+    Returns 0 when the tokens were taken, else the seconds to wait before trying again.
+    Fails open: if Redis is unreachable nothing is rate limited.
+    """
+    keys = list(buckets)
+    args = [time.time()]
+    for capacity, refill_per_second in buckets.values():
+        args.extend([capacity, refill_per_second])
+    try:
+        taken, retry_after = get_redis_client().eval(TOKEN_BUCKET_SCRIPT, len(keys), *keys, *args)
+    except Exception as e:
+        print(f"[kv] failed to take tokens from {keys}, allowing request: {e}")
+        return 0
+    return 0 if int(taken) else float(retry_after)
+
+
+def acquire_slot(key: str, slot: str, limit: int, max_age: int) -> bool:
+    """Hold one of limit slots in key until release_slot or max_age seconds have passed.
+
+    Fails open: if Redis is unreachable every caller gets a slot.
+    """
+    try:
+        return bool(get_redis_client().eval(ACQUIRE_SLOT_SCRIPT, 1, key, time.time(), max_age, limit, slot))
+    except Exception as e:
+        print(f"[kv] failed to acquire slot in {key}, allowing request: {e}")
+        return True
+
+
+def release_slot(key: str, slot: str):
+    try:
+        get_redis_client().zrem(key, slot)
+    except Exception as e:
+        print(f"[kv] failed to release slot {slot} in {key}: {e}")
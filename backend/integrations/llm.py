@@ -1,55 +1,510 @@
+import base64
+import functools
+import hashlib
+import importlib.util
+import json
 import os
-from typing import Tuple, Optional
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Tuple, Optional
+import httpx
+import numpy as np
 from openai import OpenAI
+from backend.config import LLM_CACHE, LLM_HTTP, LLM_ROUTER, QUERY_EXPANSION
+from backend.integrations.kv import get_redis_client, is_kv_configured
 from backend.utils.timing import measure_time
 import re
 
 
+@functools.lru_cache(maxsize=None)
+def get_llm_http_client() -> httpx.Client:
+    """Connection pool shared by every LLM provider client in this container"""
+    http2 = LLM_HTTP["HTTP2"] and importlib.util.find_spec("h2") is not None
+    return httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP["MAX_CONNECTIONS"],
+            max_keepalive_connections=LLM_HTTP["MAX_KEEPALIVE_CONNECTIONS"],
+            keepalive_expiry=LLM_HTTP["KEEPALIVE_EXPIRY"],
+        ),
+        # per request timeouts are set by the OpenAI client
+        timeout=None,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_client(api_key: str, base_url: str) -> OpenAI:
+    """One OpenAI compatible client per provider and key, reused across calls"""
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=get_llm_http_client())
+
+
 def get_deepseek_client() -> OpenAI:
     """Get a Deepseek client."""
-    return OpenAI(
-        api_key=os.environ["DEEPSEEK_API_KEY"], base_url="https://api.deepseek.com/v1"
-    )
+    return _get_client(os.environ["DEEPSEEK_API_KEY"], "https://api.deepseek.com/v1")
 
 
 def get_openai_client() -> OpenAI:
     """Get an OpenAI client."""
-    return OpenAI(
-        api_key=os.environ["REAL_OPENAI_API_KEY"], base_url="https://api.openai.com/v1"
-    )
+    return _get_client(os.environ["REAL_OPENAI_API_KEY"], "https://api.openai.com/v1")
 
 
 def get_venice_ai_client() -> OpenAI:
     """Get a Venice AI client."""
-    return OpenAI(
-        api_key=os.environ["VENICE_AI_API_KEY"], base_url="https://api.venice.ai/api/v1"
-    )
+    return _get_client(os.environ["VENICE_AI_API_KEY"], "https://api.venice.ai/api/v1")
 
 
 def get_together_ai_client() -> OpenAI:
     """Get a Together AI client."""
-    return OpenAI(
-        api_key=os.environ["TOGETHERAI_API_KEY"],
-        base_url="https://api.together.xyz/v1",
-    )
-
-
-@measure_time
-def send_prompt_to_reasoning_model(prompt: str, system_prompt: Optional[str] = None) -> Tuple[str, str]:
-    # client = get_together_ai_client()
-    client = get_deepseek_client()
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": prompt})
-
-    response = client.chat.completions.create(
-        model="deepseek-reasoner",
-        temperature=0.2,
-        messages=messages,
-    )
-    content = response.choices[0].message.content.strip()
-    print(f'reasoning model response: {content}')
+    return _get_client(os.environ["TOGETHERAI_API_KEY"], "https://api.together.xyz/v1")
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(str(text).split())
+
+
+@functools.lru_cache(maxsize=256)
+def _embed_prompt(text: str) -> tuple[float, ...]:
+    client = get_openai_client().with_options(timeout=LLM_CACHE["EMBEDDING_TIMEOUT"], max_retries=0)
+    response = client.embeddings.create(model=LLM_CACHE["EMBEDDING_MODEL"], input=text)
+    return tuple(response.data[0].embedding)
+
+
+def _encode_embedding(embedding) -> str:
+    # float16 is plenty for a similarity threshold and a fraction of the size of a JSON list
+    return base64.b64encode(np.asarray(embedding, dtype=np.float16).tobytes()).decode("ascii")
+
+
+def _decode_embedding(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float16)
+
+
+class LLMResponseCache:
+    """Completions shared across containers in Redis, keyed by a hash of the normalized request.
+
+    Semantic lookups additionally reuse the answer to an earlier prompt whose last
+    message is nearly identical by embedding similarity, comparing against the newest
+    MAX_SEMANTIC_CANDIDATES prompts of the same scope. Entries expire after TTL and the
+    oldest are dropped beyond MAX_ENTRIES, together with their embeddings. All operations
+    are best effort: if Redis is unreachable the call simply goes to the model.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "llm-cache",
+        ttl: int = LLM_CACHE["TTL"],
+        max_entries: int = LLM_CACHE["MAX_ENTRIES"],
+        similarity_threshold: float = LLM_CACHE["SEMANTIC_THRESHOLD"],
+        max_semantic_candidates: int = LLM_CACHE["MAX_SEMANTIC_CANDIDATES"],
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_candidates = max_semantic_candidates
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return LLM_CACHE["ENABLED"] and is_kv_configured()
+
+    def get(self, request: dict, semantic: bool = False) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        try:
+            content = get_redis_client().get(self._key(request))
+            if content is not None:
+                self.stats["hits"] += 1
+                print(f"[llm_cache] hit for {request.get('model')}")
+                return content
+
+            if semantic:
+                content = self._get_similar(request)
+                if content is not None:
+                    self.stats["semantic_hits"] += 1
+                    print(f"[llm_cache] semantic hit for {request.get('model')}")
+                    return content
+
+            self.stats["misses"] += 1
+            return None
+        except Exception as e:
+            print(f"[llm_cache] lookup failed: {e}")
+            return None
+
+    def put(self, request: dict, content: str, semantic: bool = False):
+        if not self.enabled or not content:
+            return
+
+        try:
+            redis_client = get_redis_client()
+            key = self._key(request)
+            redis_client.set(key, content, ex=self.ttl)
+            redis_client.zadd(self._index_key(), {key: time.time()})
+            if semantic:
+                self._put_embedding(key, self._embeddings_key(request), request)
+            self._evict_oldest()
+        except Exception as e:
+            print(f"[llm_cache] failed to store completion: {e}")
+
+    def _get_similar(self, request: dict) -> Optional[str]:
+        redis_client = get_redis_client()
+        embeddings_key = self._embeddings_key(request)
+        stored = redis_client.hgetall(embeddings_key)
+        if not stored:
+            return None
+
+        keys = list(stored)
+        contents = redis_client.mget(keys)
+        # embeddings of completions that expired by TTL are cleaned up lazily
+        expired = [key for key, content in zip(keys, contents) if content is None]
+        if expired:
+            self._remove_embeddings(embeddings_key, expired)
+        candidates = [(key, content) for key, content in zip(keys, contents) if content is not None]
+        if not candidates:
+            return None
+
+        matrix = np.array([_decode_embedding(stored[key]) for key, _ in candidates], dtype=np.float32)
+        query = np.array(_embed_prompt(self._last_message(request)), dtype=np.float32)
+        scores = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return candidates[best][1]
+
+    def _put_embedding(self, key: str, embeddings_key: str, request: dict):
+        redis_client = get_redis_client()
+        redis_client.hset(embeddings_key, key, _encode_embedding(_embed_prompt(self._last_message(request))))
+        redis_client.zadd(f"{embeddings_key}:index", {key: time.time()})
+        redis_client.hset(self._scopes_key(), key, embeddings_key)
+        for scoped_key in (embeddings_key, f"{embeddings_key}:index"):
+            redis_client.expire(scoped_key, self.ttl)
+
+        overflow = redis_client.zcard(f"{embeddings_key}:index") - self.max_semantic_candidates
+        if overflow > 0:
+            dropped = [dropped_key for dropped_key, _ in redis_client.zpopmin(f"{embeddings_key}:index", overflow)]
+            self._remove_embeddings(embeddings_key, dropped)
+
+    def _remove_embeddings(self, embeddings_key: str, keys: list[str]):
+        redis_client = get_redis_client()
+        redis_client.hdel(embeddings_key, *keys)
+        redis_client.zrem(f"{embeddings_key}:index", *keys)
+        redis_client.hdel(self._scopes_key(), *keys)
+
+    def _evict_oldest(self):
+        redis_client = get_redis_client()
+        overflow = redis_client.zcard(self._index_key()) - self.max_entries
+        if overflow > 0:
+            evicted = [key for key, _ in redis_client.zpopmin(self._index_key(), overflow)]
+            redis_client.delete(*evicted)
+            for key, embeddings_key in zip(evicted, redis_client.hmget(self._scopes_key(), evicted)):
+                if embeddings_key:
+                    self._remove_embeddings(embeddings_key, [key])
+
+    def _key(self, request: dict) -> str:
+        return f"{self.namespace}:{self._hash(self._normalize(request))}"
+
+    def _embeddings_key(self, request: dict) -> str:
+        """Prompts are only compared with others that share the model, params and earlier messages"""
+        scope = self._normalize(request)
+        scope["messages"] = scope["messages"][:-1]
+        return f"{self.namespace}:embeddings:{self._hash(scope)}"
+
+    def _index_key(self) -> str:
+        return f"{self.namespace}:index"
+
+    def _scopes_key(self) -> str:
+        """Embeddings hash each semantically cached completion is stored in, so eviction can prune it"""
+        return f"{self.namespace}:embedding-scopes"
+
+    @staticmethod
+    def _normalize(request: dict) -> dict:
+        normalized = dict(request)
+        normalized["messages"] = [
+            {"role": message["role"], "content": _normalize_text(message["content"])}
+            for message in request.get("messages", [])
+        ]
+        return normalized
+
+    @staticmethod
+    def _hash(value: dict) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def _last_message(request: dict) -> str:
+        return _normalize_text(request["messages"][-1]["content"])
+
+
+# one cache per container, backed by the shared Redis
+llm_cache = LLMResponseCache()
+
+
+def cached_chat_completion(client: OpenAI, semantic: bool = False, **request) -> str:
+    """Content of a chat completion, served from the shared response cache when possible.
+
+    Args:
+        client: OpenAI compatible client, its base URL is part of the cache key
+        semantic: Also reuse answers to nearly identical prompts
+        **request: Arguments for client.chat.completions.create
+    """
+    cache_request = dict(request, base_url=str(client.base_url))
+    content = llm_cache.get(cache_request, semantic=semantic)
+    if content is not None:
+        return content
+
+    response = client.chat.completions.create(**request)
+    content = response.choices[0].message.content or ""
+    llm_cache.put(cache_request, content, semantic=semantic)
+    return content
+
+
+# provider name -> (client factory, env var holding its API key)
+LLM_PROVIDERS = {
+    "deepseek": (get_deepseek_client, "DEEPSEEK_API_KEY"),
+    "openai": (get_openai_client, "REAL_OPENAI_API_KEY"),
+    "venice": (get_venice_ai_client, "VENICE_AI_API_KEY"),
+    "together": (get_together_ai_client, "TOGETHERAI_API_KEY"),
+}
+
+
+class LLMRouter:
+    """Sends chat completions to the fastest healthy provider/model for a kind of request.
+
+    Keeps rolling latency and error stats per route. If the chosen route is slower than
+    its p95, a hedged request goes to the next route and the first good answer wins.
+    A failed request fails over to the next route right away.
+    """
+
+    def __init__(self, routes: dict = LLM_ROUTER["ROUTES"], window: int = LLM_ROUTER["WINDOW"]):
+        self.routes = routes
+        self._samples: dict[Tuple[str, str], deque] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def complete(self, kind: str, semantic: bool = False, cache: bool = True, **request) -> str:
+        """Content of a chat completion for a kind of request ("reasoning", "chat").
+
+        Pass cache=False for requests that should get a fresh answer every time.
+        """
+        if not cache:
+            return self._complete_uncached(kind, request)
+
+        cache_request = dict(request, route=kind)
+        content = llm_cache.get(cache_request, semantic=semantic)
+        if content is not None:
+            return content
+
+        content = self._complete_uncached(kind, request)
+        llm_cache.put(cache_request, content, semantic=semantic)
+        return content
+
+    def rank(self, kind: str) -> list[Tuple[str, str]]:
+        """Available routes for a kind, best first: healthy, then known fast, then configured order"""
+        models = [
+            route for route in self.routes[kind]["models"]
+            if os.environ.get(LLM_PROVIDERS[route[0]][1])
+        ]
+
+        def sort_key(indexed_route):
+            index, route = indexed_route
+            stats = self.route_stats(route)
+            known = stats["samples"] >= LLM_ROUTER["MIN_SAMPLES"]
+            unhealthy = known and stats["error_rate"] > LLM_ROUTER["MAX_ERROR_RATE"]
+            return (unhealthy, not known, stats["p50"] if known else 0.0, index)
+
+        return [route for _, route in sorted(enumerate(models), key=sort_key)]
+
+    def route_stats(self, route: Tuple[str, str]) -> dict:
+        with self._lock:
+            samples = list(self._samples.get(tuple(route), []))
+        latencies = [latency for latency, ok in samples if ok]
+        return {
+            "samples": len(samples),
+            "error_rate": sum(1 for _, ok in samples if not ok) / len(samples) if samples else 0.0,
+            "p50": float(np.percentile(latencies, 50)) if latencies else 0.0,
+            "p95": float(np.percentile(latencies, 95)) if latencies else 0.0,
+        }
+
+    def metrics(self) -> dict:
+        return {
+            f"{provider}/{model}": self.route_stats((provider, model))
+            for route in self.routes.values()
+            for provider, model in route["models"]
+        }
+
+    def record(self, route: Tuple[str, str], latency: float, ok: bool):
+        with self._lock:
+            self._samples.setdefault(tuple(route), deque(maxlen=self._window)).append((latency, ok))
+
+    def hedge_delay(self, kind: str, route: Tuple[str, str]) -> float:
+        stats = self.route_stats(route)
+        if stats["samples"] >= LLM_ROUTER["MIN_SAMPLES"] and stats["p95"] > 0:
+            return stats["p95"]
+        return self.routes[kind]["hedge_after"]
+
+    def _complete_uncached(self, kind: str, request: dict) -> str:
+        routes = self.rank(kind)
+        if not routes:
+            raise RuntimeError(f"No LLM provider configured for {kind} requests")
+
+        results = queue.Queue()
+        errors = []
+
+        def launch(route):
+            threading.Thread(target=self._call, args=(route, request, results), daemon=True).start()
+            return self.hedge_delay(kind, route)
+
+        delay = launch(routes.pop(0))
+        in_flight = 1
+        hedged = False
+        while in_flight:
+            can_hedge = LLM_ROUTER["HEDGE"] and routes and not hedged
+            try:
+                route, content, error = results.get(timeout=delay if can_hedge else None)
+            except queue.Empty:
+                print(f"[llm_router] no answer after {delay:.0f}s, hedging with {routes[0]}")
+                delay = launch(routes.pop(0))
+                in_flight += 1
+                hedged = True
+                continue
+
+            in_flight -= 1
+            if error is None:
+                return content
+            errors.append(f"{route[0]}/{route[1]}: {error}")
+            if routes and not in_flight:
+                print(f"[llm_router] {route} failed, failing over to {routes[0]}")
+                delay = launch(routes.pop(0))
+                in_flight += 1
+
+        raise RuntimeError(f"All LLM providers failed for {kind} request: {errors}")
+
+    def _call(self, route: Tuple[str, str], request: dict, results: queue.Queue):
+        provider, model = route
+        started_at = time.time()
+        try:
+            client = LLM_PROVIDERS[provider][0]()
+            response = client.chat.completions.create(**dict(request, model=model))
+            content = response.choices[0].message.content
+            if not content:
+                raise ValueError("empty completion")
+        except Exception as e:
+            self.record(route, time.time() - started_at, ok=False)
+            results.put((route, None, e))
+            return
+        self.record(route, time.time() - started_at, ok=True)
+        results.put((route, content, None))
+
+
+    def stream(self, kind: str, request: dict) -> Iterator[Tuple[Tuple[str, str], object]]:
+        """(route, chunk) for every chunk of a streamed chat completion.
+
+        A route that fails or ends before sending content fails over to the next one, and a
+        route without content after its hedge delay is hedged. The first route to send
+        content wins and the others are cancelled; an error after that is raised as is.
+        """
+        routes = self.rank(kind)
+        if not routes:
+            raise RuntimeError(f"No LLM provider configured for {kind} requests")
+
+        events = queue.Queue()
+        cancelled: dict[Tuple[str, str], threading.Event] = {}
+        started_at: dict[Tuple[str, str], float] = {}
+        errors = []
+
+        def launch(route):
+            cancelled[route] = threading.Event()
+            started_at[route] = time.time()
+            threading.Thread(
+                target=self._stream_call, args=(route, request, events, cancelled[route]), daemon=True
+            ).start()
+            return self.hedge_delay(kind, route)
+
+        delay = launch(routes.pop(0))
+        in_flight = 1
+        hedged = False
+        winner = None
+        try:
+            while True:
+                can_hedge = winner is None and LLM_ROUTER["HEDGE"] and routes and not hedged
+                try:
+                    route, event, payload = events.get(timeout=delay if can_hedge else None)
+                except queue.Empty:
+                    print(f"[llm_router] no stream content after {delay:.0f}s, hedging with {routes[0]}")
+                    delay = launch(routes.pop(0))
+                    in_flight += 1
+                    hedged = True
+                    continue
+
+                if winner is not None and route != winner:
+                    continue
+                if event == "chunk":
+                    if winner is None:
+                        reasoning_text, text = _delta_text(payload)
+                        if not reasoning_text and not text:
+                            continue
+                        winner = route
+                        for other, cancel in cancelled.items():
+                            if other != route:
+                                cancel.set()
+                    yield route, payload
+                    continue
+                if event == "done" and winner is not None:
+                    self.record(route, time.time() - started_at[route], ok=True)
+                    return
+
+                error = payload if event == "error" else ValueError("stream ended without content")
+                self.record(route, time.time() - started_at[route], ok=False)
+                if winner is not None:
+                    raise error
+                in_flight -= 1
+                errors.append(f"{route[0]}/{route[1]}: {error}")
+                if routes and not in_flight:
+                    print(f"[llm_router] {route} stream failed, failing over to {routes[0]}")
+                    delay = launch(routes.pop(0))
+                    in_flight += 1
+                elif not in_flight:
+                    raise RuntimeError(f"All LLM providers failed for {kind} stream: {errors}")
+        finally:
+            for cancel in cancelled.values():
+                cancel.set()
+
+    def _stream_call(
+        self, route: Tuple[str, str], request: dict, events: queue.Queue, cancelled: threading.Event
+    ):
+        provider, model = route
+        try:
+            client = LLM_PROVIDERS[provider][0]()
+            stream = client.chat.completions.create(**dict(request, model=model, stream=True))
+            for chunk in stream:
+                if cancelled.is_set():
+                    close = getattr(stream, "close", None)
+                    if close:
+                        close()
+                    return
+                events.put((route, "chunk", chunk))
+        except Exception as e:
+            events.put((route, "error", e))
+            return
+        events.put((route, "done", None))
+
+
+def _delta_text(chunk) -> Tuple[Optional[str], Optional[str]]:
+    """(reasoning, content) text of a stream chunk, None for what it doesn't carry"""
+    if not chunk.choices:
+        return None, None
+    delta = chunk.choices[0].delta
+    return getattr(delta, "reasoning_content", None), delta.content
+
+
+# one router per container, its latency stats build up over the container's lifetime
+llm_router = LLMRouter()
+
+
+def split_reasoning_response(content: str) -> Tuple[str, str]:
+    """Split a complete model response into (answer, reasoning) on its <think> section"""
     if "<think>" not in content or "</think>" not in content:
         return content, ""
 
@@ -73,13 +528,183 @@ def send_prompt_to_reasoning_model(prompt: str, system_prompt: Optional[str] = N
         return content, ""
 
 
+def _reasoning_messages(prompt: str, system_prompt: Optional[str]) -> list[dict]:
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+@measure_time
+def send_prompt_to_reasoning_model(prompt: str, system_prompt: Optional[str] = None) -> Tuple[str, str]:
+    content = llm_router.complete(
+        "reasoning",
+        temperature=0.2,
+        messages=_reasoning_messages(prompt, system_prompt),
+    ).strip()
+    print(f'reasoning model response: {content}')
+    return split_reasoning_response(content)
+
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class ThinkTagParser:
+    """Splits streamed text into reasoning and answer pieces as it arrives.
+
+    For models that inline their reasoning as a leading <think>...</think> section.
+    Text that could be the start of a tag split across chunks is held back until
+    the next chunk decides it.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._section: Optional[str] = None  # unknown until the first characters arrive
+
+    def feed(self, text: str) -> list[Tuple[str, str]]:
+        """("reasoning" | "answer", text) pieces that are complete after this chunk"""
+        self._buffer += text
+        pieces = []
+
+        if self._section is None:
+            stripped = self._buffer.lstrip()
+            if THINK_OPEN.startswith(stripped):
+                return pieces
+            if stripped.startswith(THINK_OPEN):
+                self._section = "reasoning"
+                self._buffer = stripped[len(THINK_OPEN):]
+            else:
+                self._section = "answer"
+
+        if self._section == "reasoning":
+            end = self._buffer.find(THINK_CLOSE)
+            if end == -1:
+                keep = _partial_tag_length(self._buffer, THINK_CLOSE)
+                self._emit(pieces, "reasoning", self._buffer[:len(self._buffer) - keep])
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                return pieces
+            self._emit(pieces, "reasoning", self._buffer[:end])
+            self._buffer = self._buffer[end + len(THINK_CLOSE):]
+            self._section = "answer"
+
+        self._emit(pieces, "answer", self._buffer)
+        self._buffer = ""
+        return pieces
+
+    def finish(self) -> list[Tuple[str, str]]:
+        """Whatever was held back once the stream has ended"""
+        pieces = []
+        self._emit(pieces, self._section or "answer", self._buffer)
+        self._buffer = ""
+        return pieces
+
+    @staticmethod
+    def _emit(pieces: list, section: str, text: str):
+        if text:
+            pieces.append((section, text))
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """Length of the longest end of text that is a proper prefix of tag"""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+@measure_time
+def stream_prompt_to_reasoning_model(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    on_reasoning: Optional[Callable[[str], None]] = None,
+    on_answer: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, str, dict]:
+    """Streaming variant of send_prompt_to_reasoning_model.
+
+    Reasoning and answer text are passed to the callbacks as they arrive, whether the
+    provider sends reasoning as a separate field (DeepSeek) or inline in <think> tags.
+    Until the first text arrives, a failing or slow route is failed over or hedged.
+
+    Returns:
+        Tuple (answer, reasoning, stats) with time to first token and tokens per second in stats
+    """
+    request = dict(
+        temperature=0.2,
+        messages=_reasoning_messages(prompt, system_prompt),
+    )
+    cache_request = dict(request, route="reasoning")
+
+    cached = llm_cache.get(cache_request)
+    if cached is not None:
+        content, reasoning = split_reasoning_response(cached.strip())
+        if on_answer and content:
+            on_answer(content)
+        return content, reasoning, {"cached": True}
+
+    pieces = {"reasoning": [], "answer": []}
+    callbacks = {"reasoning": on_reasoning, "answer": on_answer}
+
+    def emit(section: str, text: str):
+        pieces[section].append(text)
+        if callbacks[section]:
+            callbacks[section](text)
+
+    parser = ThinkTagParser()
+    started_at = time.time()
+    first_token_at = None
+    chunk_count = 0
+    usage = None
+    stream_request = dict(request, stream_options={"include_usage": True})
+    for route, chunk in llm_router.stream("reasoning", stream_request):
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        reasoning_text, text = _delta_text(chunk)
+        if not reasoning_text and not text:
+            continue
+        if first_token_at is None:
+            first_token_at = time.time()
+        chunk_count += 1
+
+        if reasoning_text:
+            emit("reasoning", reasoning_text)
+        if text:
+            for section, piece in parser.feed(text):
+                emit(section, piece)
+    for section, piece in parser.finish():
+        emit(section, piece)
+
+    finished_at = time.time()
+    provider, model = route
+    # without usage data every content chunk counts as roughly one token
+    completion_tokens = usage.completion_tokens if usage else chunk_count
+    generation_time = finished_at - (first_token_at or started_at)
+    stats = {
+        "cached": False,
+        "time_to_first_token": (first_token_at or finished_at) - started_at,
+        "completion_tokens": completion_tokens,
+        "tokens_per_second": completion_tokens / generation_time if generation_time > 0 else 0.0,
+        "elapsed": finished_at - started_at,
+    }
+    print(
+        f"[llm] {provider}/{model}: first token after {stats['time_to_first_token']:.1f}s, "
+        f"{completion_tokens} tokens at {stats['tokens_per_second']:.1f} tokens/s"
+    )
+
+    content = "".join(pieces["answer"]).strip()
+    reasoning = "".join(pieces["reasoning"]).strip()
+    llm_cache.put(cache_request, content)
+    return content, reasoning, stats
+
+
 def generate_project_name(prompt: str) -> str:
     """Generate a project name from the user's prompt using LLM."""
-    deepseek = get_deepseek_client()
-
     try:
-        response = deepseek.chat.completions.create(
-            model="deepseek-chat",
+        # names must differ between submissions of the same prompt, the repo is named after them
+        llm_content = llm_router.complete(
+            "chat",
+            cache=False,
             messages=[
                 {
                     "role": "system",
@@ -92,8 +717,7 @@ def generate_project_name(prompt: str) -> str:
             ],
             max_tokens=25,
             temperature=1.5,
-        )
-        llm_content = response.choices[0].message.content.strip()
+        ).strip()
         print(f'generate_project_name: response "{llm_content}"')
         project_name = llm_content.split("\n")[0].replace('"', "").strip()
         print(f'generate_project_name: project_name "{project_name}"')
@@ -126,46 +750,86 @@ Second, generate queries for each of them. Return a list of queries, one per lin
 """
 
 
+# Dropped when falling back to keyword queries, the rest of the prompt is what we search for
+QUERY_STOPWORDS = {
+    "a", "about", "add", "all", "also", "an", "and", "any", "app", "are", "as", "at", "be",
+    "build", "but", "by", "can", "create", "do", "for", "from", "get", "has", "have", "i",
+    "if", "in", "into", "is", "it", "its", "just", "let", "like", "make", "me", "miniapp",
+    "my", "need", "new", "of", "on", "one", "or", "our", "please", "should", "show", "so",
+    "some", "that", "the", "their", "them", "then", "there", "this", "to", "up", "us", "use",
+    "want", "we", "when", "where", "which", "while", "who", "will", "with", "would", "you", "your",
+}
+
+
+def parse_search_queries(llm_content: str) -> list[str]:
+    """Turn a model response with one query per line into a list of queries"""
+    llm_content = llm_content.replace("`", "").strip()
+    llm_content = llm_content.replace("Refined search queries:", "").replace('[]', '').strip()
+    queries = [q.lstrip("-").strip() for q in llm_content.split("\n") if q]
+    queries = [q for q in queries if q]
+    queries = [re.sub(r'^\d+\.\s+', '', q) for q in queries]
+    return queries[:QUERY_EXPANSION["MAX_QUERIES"]]
+
+
+def generate_keyword_queries(user_input: str, max_terms: int = 12) -> list[str]:
+    """Deterministic fallback: one query made of the distinct non-stopword terms of the input"""
+    terms = re.findall(r"[a-z0-9][a-z0-9_\-.$]*", user_input.lower())
+    keywords = list(dict.fromkeys(
+        term.strip(".") for term in terms
+        if term.strip(".") not in QUERY_STOPWORDS and len(term.strip(".")) > 1
+    ))
+    return [" ".join(keywords[:max_terms])] if keywords else []
+
+
+# runs query expansion so its cache lookup, embedding and model call share one deadline
+_query_expansion_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-expansion")
+
+
 @measure_time
 def generate_search_queries_from_user_input(
     user_input: str
 ) -> list[str]:
-    """Generate expanded technical queries for documentation search."""
+    """Generate expanded technical queries for documentation search.
+
+    Uses a fast chat model with a capped response length. If the cache lookup and the
+    model together fail or take longer than the timeout budget, falls back to keyword queries.
+    """
     print(f"Generating queries from user input: {user_input}")
 
     try:
-        prompt = f"""Original user input: {user_input}
-        Generate technical search queries — one per line — that will help retrieve relevant documentation.
-        Up to 3 queries should be generated.
-        If you generate no queries because no technical details are provided, just return an empty list.
-        Refined search queries:
-        """
-        llm_content, _ = send_prompt_to_reasoning_model(prompt, system_prompt=QUERY_GEN_STR)
-        # client = get_deepseek_client()
-
-        # response = client.chat.completions.create(
-        #     model="deepseek-ai/DeepSeek-R1",
-        #     messages=[
-        #         {"role": "system", "content": QUERY_GEN_STR},
-        #         {
-        #             "role": "user",
-        #             "content": f"Original user input: {user_input} Generate technical search queries — one per line — that will help retrieve relevant documentation. Refined search queries:",
-        #         },
-        #     ],
-        #     temperature=0.0,
-        # )
-
-        # llm_content = response.choices[0].message.content.strip()
+        llm_content = _query_expansion_executor.submit(_expand_queries, user_input).result(
+            timeout=QUERY_EXPANSION["TIMEOUT"]
+        )
         print("Model response for search queries prompt:", llm_content)
 
-        llm_content = llm_content.replace("`", "").strip()
-        llm_content = llm_content.replace("Refined search queries:", "").replace('[]', '').strip()
-        queries = [q.lstrip("-").strip() for q in llm_content.split("\n") if q]
-        queries = [q for q in queries if q]
-        queries = [re.sub(r'^\d+\.\s+', '', q) for q in queries]
+        queries = parse_search_queries(llm_content)
         print(f"Generated queries: {queries}")
         return queries
 
     except Exception as e:
-        print(f"Failed to generate search queries from user input. Error: {e}")
-        return []
+        queries = generate_keyword_queries(user_input)
+        print(f"Failed to generate search queries from user input, using keywords {queries}. Error: {e!r}")
+        return queries
+
+
+def _expand_queries(user_input: str) -> str:
+    prompt = f"""Original user input: {user_input}
+        Generate technical search queries — one per line — that will help retrieve relevant documentation.
+        Up to {QUERY_EXPANSION["MAX_QUERIES"]} queries should be generated.
+        If you generate no queries because no technical details are provided, just return an empty list.
+        Refined search queries:
+        """
+    client = get_deepseek_client().with_options(
+        timeout=QUERY_EXPANSION["TIMEOUT"], max_retries=0
+    )
+    return cached_chat_completion(
+        client,
+        semantic=True,
+        model=QUERY_EXPANSION["MODEL"],
+        messages=[
+            {"role": "system", "content": QUERY_GEN_STR},
+            {"role": "user", "content": prompt},
+        ],
+        max_tokens=QUERY_EXPANSION["MAX_TOKENS"],
+        temperature=0.0,
+    ).strip()
@@ -0,0 +1,145 @@
+import os
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from backend.integrations import db
+from backend.integrations.db import LogBuffer, Database, get_connection_stats
+
+
+class TestLogBuffer(unittest.TestCase):
+    def setUp(self):
+        self.mock_client = Mock()
+        self.mock_insert = self.mock_client.table.return_value.insert
+
+    def _entry(self, i: int) -> dict:
+        return {"job_id": "job", "source": "test", "text": f"line {i}"}
+
+    def test_add_does_not_insert_below_threshold(self):
+        buffer = LogBuffer(self.mock_client, max_batch_size=10, flush_interval=60)
+
+        for i in range(3):
+            buffer.add(self._entry(i))
+
+        self.mock_insert.assert_not_called()
+        self.assertEqual(buffer.pending_count(), 3)
+
+    def test_flush_writes_all_entries_in_one_insert(self):
+        buffer = LogBuffer(self.mock_client, max_batch_size=10, flush_interval=60)
+        for i in range(3):
+            buffer.add(self._entry(i))
+
+        written = buffer.flush()
+
+        self.assertEqual(written, 3)
+        self.mock_client.table.assert_called_with("logs")
+        self.mock_insert.assert_called_once_with([self._entry(i) for i in range(3)])
+        self.assertEqual(buffer.pending_count(), 0)
+
+    def test_flush_with_empty_queue_is_noop(self):
+        buffer = LogBuffer(self.mock_client)
+
+        self.assertEqual(buffer.flush(), 0)
+        self.mock_insert.assert_not_called()
+
+    def test_reaching_batch_size_triggers_background_flush(self):
+        buffer = LogBuffer(self.mock_client, max_batch_size=2, flush_interval=60)
+
+        buffer.add(self._entry(0))
+        buffer.add(self._entry(1))
+
+        deadline = time.time() + 2
+        while not self.mock_insert.called and time.time() < deadline:
+            time.sleep(0.01)
+        self.mock_insert.assert_called_once_with([self._entry(0), self._entry(1)])
+
+    def test_failed_flush_keeps_entries_for_retry(self):
+        buffer = LogBuffer(self.mock_client, max_batch_size=10, flush_interval=60)
+        self.mock_insert.return_value.execute.side_effect = [Exception("network down"), Mock()]
+        buffer.add(self._entry(0))
+
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending_count(), 1)
+
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.pending_count(), 0)
+
+
+class TestSupabaseClientRegistry(unittest.TestCase):
+    def setUp(self):
+        db._client_registry.clear()
+        env = {"SUPABASE_URL": "https://example.supabase.co", "SUPABASE_API_KEY": "key"}
+        self.env_patch = patch.dict(os.environ, env)
+        self.env_patch.start()
+
+    def tearDown(self):
+        self.env_patch.stop()
+        db._client_registry.clear()
+
+    @patch("supabase.create_client")
+    def test_databases_share_one_client_and_log_buffer(self, mock_create_client):
+        stats_before = get_connection_stats()
+
+        first, second = Database(), Database()
+
+        mock_create_client.assert_called_once()
+        self.assertIs(first.client, second.client)
+        self.assertIs(first.log_buffer, second.log_buffer)
+        stats = get_connection_stats()
+        self.assertEqual(stats["clients_created"] - stats_before["clients_created"], 1)
+        self.assertEqual(stats["clients_reused"] - stats_before["clients_reused"], 1)
+
+    def test_missing_credentials_raise(self):
+        with patch.dict(os.environ, {"SUPABASE_URL": ""}):
+            with self.assertRaises(RuntimeError):
+                Database()
+
+
+class TestStatusUpdates(unittest.TestCase):
+    def setUp(self):
+        self.mock_client = Mock()
+        self.db = Database.__new__(Database)
+        self.db.client = self.mock_client
+        self.db.log_buffer = LogBuffer(self.mock_client)
+
+    def test_update_job_status_is_one_rpc_call(self):
+        self.db.update_job_status("job-1", "failed", "boom")
+
+        self.mock_client.rpc.assert_called_once_with(
+            "set_job_status",
+            {"p_job_id": "job-1", "p_status": "failed", "p_error": "boom"},
+        )
+        self.mock_client.table.assert_not_called()
+
+    def test_update_job_status_flushes_pending_logs_first(self):
+        self.db.add_log("job-1", "system", "before status change")
+
+        self.db.update_job_status("job-1", "completed")
+
+        self.assertEqual(
+            [c[0] for c in self.mock_client.method_calls if c[0] in ("table", "rpc")],
+            ["table", "rpc"],
+        )
+
+    def test_update_build_status_is_one_rpc_call(self):
+        self.db.update_build_status("build-1", "success")
+
+        self.mock_client.rpc.assert_called_once_with(
+            "set_build_status",
+            {"p_build_id": "build-1", "p_status": "success", "p_error": None},
+        )
+
+    def test_get_latest_build_logs_fetches_one_row_with_logs_only(self):
+        query = self.mock_client.table.return_value.select.return_value
+        limited = query.eq.return_value.order.return_value.limit
+        limited.return_value.execute.return_value.data = [{"id": "b1", "logs": "error TS2304"}]
+
+        logs = self.db.get_latest_build_logs("project-1")
+
+        self.assertEqual(logs, "error TS2304")
+        self.mock_client.table.return_value.select.assert_called_once_with("id, logs:data->>logs")
+        limited.assert_called_once_with(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
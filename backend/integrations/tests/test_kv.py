@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from backend.integrations import kv
+from backend.integrations.kv import acquire_slot, claim_once, release_claim, take_tokens
+
+
+class TestClaimOnce(unittest.TestCase):
+    def setUp(self):
+        self.redis = Mock()
+        patcher = patch.object(kv, "get_redis_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_delivery_claims_key(self):
+        self.redis.set.return_value = True
+
+        self.assertTrue(claim_once("farcaster-webhook:cast:0xabc", 3600))
+        self.redis.set.assert_called_once_with("farcaster-webhook:cast:0xabc", "1", nx=True, ex=3600)
+
+    def test_duplicate_delivery_is_rejected(self):
+        self.redis.set.return_value = None
+
+        self.assertFalse(claim_once("farcaster-webhook:cast:0xabc", 3600))
+
+    def test_fails_open_when_redis_is_down(self):
+        self.redis.set.side_effect = ConnectionError("down")
+
+        self.assertTrue(claim_once("farcaster-webhook:cast:0xabc", 3600))
+
+    def test_release_forgets_claim(self):
+        release_claim("farcaster-webhook:cast:0xabc")
+
+        self.redis.delete.assert_called_once_with("farcaster-webhook:cast:0xabc")
+
+
+class TestTokenBuckets(unittest.TestCase):
+    def setUp(self):
+        self.redis = Mock()
+        patcher = patch.object(kv, "get_redis_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_takes_from_all_buckets_in_one_script_call(self):
+        self.redis.eval.return_value = [1, "0"]
+
+        retry_after = take_tokens({"bucket:fid:1": (5, 0.5), "bucket:global": (60, 2.0)})
+
+        self.assertEqual(retry_after, 0)
+        _, numkeys, *args = self.redis.eval.call_args.args
+        self.assertEqual(numkeys, 2)
+        self.assertEqual(args[:2], ["bucket:fid:1", "bucket:global"])
+        self.assertEqual(args[3:], [5, 0.5, 60, 2.0])
+
+    def test_empty_bucket_returns_retry_after(self):
+        self.redis.eval.return_value = [0, "12.5"]
+
+        self.assertEqual(take_tokens({"bucket:fid:1": (5, 0.5)}), 12.5)
+
+    def test_fails_open_when_redis_is_down(self):
+        self.redis.eval.side_effect = ConnectionError("down")
+
+        self.assertEqual(take_tokens({"bucket:fid:1": (5, 0.5)}), 0)
+
+    def test_full_slot_set_rejects(self):
+        self.redis.eval.return_value = 0
+
+        self.assertFalse(acquire_slot("active-jobs", "job-1", limit=2, max_age=60))
+
+    def test_slot_acquire_fails_open(self):
+        self.redis.eval.side_effect = ConnectionError("down")
+
+        self.assertTrue(acquire_slot("active-jobs", "job-1", limit=2, max_age=60))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,429 @@
+import os
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import openai
+
+from backend.integrations import llm
+from backend.integrations.llm import (
+    LLMResponseCache,
+    LLMRouter,
+    ThinkTagParser,
+    cached_chat_completion,
+    stream_prompt_to_reasoning_model,
+    generate_keyword_queries,
+    generate_search_queries_from_user_input,
+)
+
+
+def _chat_response(content: str) -> Mock:
+    response = Mock()
+    response.choices = [Mock(message=Mock(content=content))]
+    return response
+
+
+class TestGenerateSearchQueries(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(llm, "get_deepseek_client")
+        self.addCleanup(patcher.stop)
+        self.client = patcher.start().return_value.with_options.return_value
+        self.create = self.client.chat.completions.create
+
+    def test_uses_capped_chat_model(self):
+        self.create.return_value = _chat_response("1. Neynar API followers\n- Degen tips API\n3. wagmi mint\n4. extra")
+
+        queries = generate_search_queries_from_user_input("frame with neynar followers and degen tips")
+
+        self.assertEqual(queries, ["Neynar API followers", "Degen tips API", "wagmi mint"])
+        kwargs = self.create.call_args.kwargs
+        self.assertEqual(kwargs["model"], llm.QUERY_EXPANSION["MODEL"])
+        self.assertEqual(kwargs["max_tokens"], llm.QUERY_EXPANSION["MAX_TOKENS"])
+
+    def test_no_technical_details_gives_no_queries(self):
+        self.create.return_value = _chat_response("[]")
+
+        self.assertEqual(generate_search_queries_from_user_input("make it pretty"), [])
+
+    def test_timeout_falls_back_to_keywords(self):
+        self.create.side_effect = openai.APITimeoutError(request=Mock())
+
+        queries = generate_search_queries_from_user_input("Show my Neynar followers and mint an NFT on Base")
+
+        self.assertEqual(queries, ["neynar followers mint nft base"])
+
+    def test_slow_cache_lookup_counts_against_the_timeout(self):
+        def slow_lookup(*args, **kwargs):
+            time.sleep(1)
+            return "late answer"
+
+        with patch.object(llm, "cached_chat_completion", side_effect=slow_lookup), \
+                patch.dict(llm.QUERY_EXPANSION, {"TIMEOUT": 0.05}):
+            started = time.time()
+            queries = generate_search_queries_from_user_input("Show my Neynar followers")
+
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(queries, ["neynar followers"])
+
+    def test_keyword_queries_are_deterministic_and_deduplicated(self):
+        self.assertEqual(
+            generate_keyword_queries("Build a frame. The frame shows $DEGEN tips!"),
+            ["frame shows degen tips"],
+        )
+        self.assertEqual(generate_keyword_queries("make it for me"), [])
+
+
+class FakeRedis:
+    """The handful of Redis commands the response cache uses, in memory"""
+
+    def __init__(self):
+        self.values = {}
+        self.sorted_sets = {}
+        self.hashes = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def expire(self, key, seconds):
+        pass
+
+    def zadd(self, key, mapping):
+        self.sorted_sets.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.sorted_sets.get(key, {}))
+
+    def zpopmin(self, key, count):
+        members = sorted(self.sorted_sets.get(key, {}).items(), key=lambda item: item[1])[:count]
+        for member, _ in members:
+            del self.sorted_sets[key][member]
+        return members
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.sorted_sets.get(key, {}).pop(member, None)
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.embeddings = {}
+        for target, value in [
+            ("get_redis_client", lambda: self.redis),
+            ("is_kv_configured", lambda: True),
+            ("_embed_prompt", lambda text: self.embeddings[text]),
+        ]:
+            patcher = patch.object(llm, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.cache = LLMResponseCache(max_entries=2, similarity_threshold=0.95)
+        patcher = patch.object(llm, "llm_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = Mock(base_url="https://api.deepseek.com/v1/")
+        self.client.chat.completions.create.return_value = _chat_response("answer")
+
+    def _request(self, prompt: str) -> dict:
+        return {"model": "deepseek-chat", "messages": [{"role": "system", "content": "sys"}, {"role": "user", "content": prompt}]}
+
+    def test_identical_prompt_served_from_cache(self):
+        first = cached_chat_completion(self.client, **self._request("make a  frame"))
+        second = cached_chat_completion(self.client, **self._request(" make a frame\n"))
+
+        self.assertEqual(first, second)
+        self.client.chat.completions.create.assert_called_once()
+        self.assertEqual(self.cache.stats["hits"], 1)
+
+    def test_different_provider_is_a_different_entry(self):
+        cached_chat_completion(self.client, **self._request("make a frame"))
+        other = Mock(base_url="https://api.together.xyz/v1/")
+        other.chat.completions.create.return_value = _chat_response("other answer")
+
+        self.assertEqual(cached_chat_completion(other, **self._request("make a frame")), "other answer")
+
+    def test_semantic_lookup_reuses_nearly_identical_prompt(self):
+        self.embeddings = {"degen tips frame": (1.0, 0.0), "frame with degen tips": (0.99, 0.05), "weather": (0.0, 1.0)}
+        cached_chat_completion(self.client, semantic=True, **self._request("degen tips frame"))
+        cached_chat_completion(self.client, semantic=True, **self._request("frame with degen tips"))
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+        self.assertEqual(self.cache.stats["semantic_hits"], 1)
+
+        cached_chat_completion(self.client, semantic=True, **self._request("weather"))
+        self.assertEqual(self.client.chat.completions.create.call_count, 2)
+
+    def test_oldest_entries_evicted_beyond_max_entries(self):
+        for prompt in ["one", "two", "three"]:
+            self.cache.put(self._request(prompt), prompt)
+
+        self.assertIsNone(self.cache.get(self._request("one")))
+        self.assertEqual(self.cache.get(self._request("three")), "three")
+
+    def test_eviction_prunes_embeddings(self):
+        self.embeddings = {"one": (1.0, 0.0), "two": (0.0, 1.0), "three": (0.7, 0.7)}
+        for prompt in ["one", "two", "three"]:
+            self.cache.put(self._request(prompt), prompt, semantic=True)
+
+        embeddings = self.redis.hashes[self.cache._embeddings_key(self._request("one"))]
+        self.assertEqual(len(embeddings), 2)
+        self.assertEqual(len(self.redis.hashes[self.cache._scopes_key()]), 2)
+
+    def test_semantic_candidates_capped_per_scope(self):
+        self.cache = LLMResponseCache(max_entries=10, similarity_threshold=0.95, max_semantic_candidates=2)
+        self.embeddings = {"one": (1.0, 0.0), "two": (0.0, 1.0), "three": (0.7, 0.7)}
+        for prompt in ["one", "two", "three"]:
+            self.cache.put(self._request(prompt), prompt, semantic=True)
+
+        self.embeddings["first again"] = (1.0, 0.0)
+        self.assertIsNone(self.cache.get(self._request("first again"), semantic=True))
+        self.embeddings["second again"] = (0.0, 1.0)
+        self.assertEqual(self.cache.get(self._request("second again"), semantic=True), "two")
+
+    def test_project_names_are_never_cached(self):
+        with patch.object(llm.llm_router, "_complete_uncached", side_effect=["Degen Dash", "Tip Jar"]):
+            names = [llm.generate_project_name("degen tips frame") for _ in range(2)]
+
+        self.assertEqual(names, ["Degen Dash", "Tip Jar"])
+
+    def test_redis_errors_fall_through_to_the_model(self):
+        self.redis.get = Mock(side_effect=ConnectionError("down"))
+
+        self.assertEqual(cached_chat_completion(self.client, **self._request("make a frame")), "answer")
+
+
+class TestProviderClients(unittest.TestCase):
+    @patch.dict(os.environ, {"DEEPSEEK_API_KEY": "ds-key", "TOGETHERAI_API_KEY": "tg-key"})
+    def test_clients_reused_per_provider_over_one_pool(self):
+        deepseek = llm.get_deepseek_client()
+        together = llm.get_together_ai_client()
+
+        self.assertIs(llm.get_deepseek_client(), deepseek)
+        self.assertIsNot(together, deepseek)
+        self.assertEqual(str(together.base_url), "https://api.together.xyz/v1/")
+        self.assertIs(deepseek._client, llm.get_llm_http_client())
+        self.assertIs(together._client, llm.get_llm_http_client())
+
+    @patch.dict(os.environ, {"DEEPSEEK_API_KEY": "ds-key"})
+    def test_per_request_options_keep_the_shared_pool(self):
+        client = llm.get_deepseek_client().with_options(timeout=5, max_retries=0)
+
+        self.assertIs(client._client, llm.get_llm_http_client())
+
+
+def _stream_chunk(content=None, reasoning_content=None, usage=None) -> Mock:
+    chunk = Mock(usage=usage)
+    chunk.choices = [Mock(delta=Mock(content=content, reasoning_content=reasoning_content))]
+    return chunk
+
+
+class TestThinkTagParser(unittest.TestCase):
+    def _parse(self, chunks):
+        parser = ThinkTagParser()
+        pieces = [piece for chunk in chunks for piece in parser.feed(chunk)] + parser.finish()
+        return (
+            "".join(text for section, text in pieces if section == "reasoning"),
+            "".join(text for section, text in pieces if section == "answer"),
+        )
+
+    def test_tags_split_across_chunks(self):
+        chunks = ["\n<th", "ink>weigh", "ing options</th", "in", "k>\n# Spec", " body"]
+
+        self.assertEqual(self._parse(chunks), ("weighing options", "\n# Spec body"))
+
+    def test_answer_without_think_section_streams_immediately(self):
+        parser = ThinkTagParser()
+
+        self.assertEqual(parser.feed("# Spec"), [("answer", "# Spec")])
+
+    def test_unterminated_think_section_stays_reasoning(self):
+        self.assertEqual(self._parse(["<think>still going </thi"]), ("still going </thi", ""))
+
+
+class TestStreamPromptToReasoningModel(unittest.TestCase):
+    def setUp(self):
+        client = Mock()
+        self.create = client.chat.completions.create
+        for patcher in [
+            patch.dict(llm.LLM_PROVIDERS, {"deepseek": (lambda: client, "DEEPSEEK_API_KEY")}),
+            patch.dict(os.environ, {"DEEPSEEK_API_KEY": "ds-key"}),
+            patch.object(llm, "llm_router", llm.LLMRouter()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_reasoning_and_answer_forwarded_as_they_arrive(self):
+        self.create.return_value = iter([
+            _stream_chunk(reasoning_content="Think"),
+            _stream_chunk(reasoning_content="ing"),
+            _stream_chunk(content="# Spec"),
+            _stream_chunk(content="\nDetails"),
+            Mock(choices=[], usage=Mock(completion_tokens=40)),
+        ])
+        received = []
+
+        content, reasoning, stats = stream_prompt_to_reasoning_model(
+            "spec please",
+            on_reasoning=lambda text: received.append(("reasoning", text)),
+            on_answer=lambda text: received.append(("answer", text)),
+        )
+
+        self.assertEqual(content, "# Spec\nDetails")
+        self.assertEqual(reasoning, "Thinking")
+        self.assertEqual(received[0], ("reasoning", "Think"))
+        self.assertEqual(received[-1], ("answer", "\nDetails"))
+        self.assertEqual(stats["completion_tokens"], 40)
+        self.assertGreater(stats["tokens_per_second"], 0)
+        self.assertTrue(self.create.call_args.kwargs["stream"])
+        self.assertEqual(self.create.call_args.kwargs["model"], "deepseek-reasoner")
+        self.assertEqual(llm.llm_router.route_stats(("deepseek", "deepseek-reasoner"))["samples"], 1)
+
+    def test_inline_think_tags(self):
+        self.create.return_value = iter([_stream_chunk(content="<think>hmm</think>"), _stream_chunk(content="done")])
+
+        content, reasoning, _ = stream_prompt_to_reasoning_model("todo please")
+
+        self.assertEqual((content, reasoning), ("done", "hmm"))
+
+
+class TestLLMRouter(unittest.TestCase):
+    ROUTES = {
+        "chat": {"models": [("fast", "model-a"), ("slow", "model-b")], "hedge_after": 5},
+    }
+
+    def setUp(self):
+        self.clients = {"fast": Mock(), "slow": Mock()}
+        for patcher in [
+            patch.dict(llm.LLM_PROVIDERS, {
+                name: (lambda name=name: self.clients[name], f"{name.upper()}_KEY") for name in self.clients
+            }),
+            patch.dict(os.environ, {"FAST_KEY": "a", "SLOW_KEY": "b"}),
+            patch.dict(llm.LLM_ROUTER, {"MIN_SAMPLES": 2}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.router = LLMRouter(routes=self.ROUTES, window=10)
+
+    def _answer(self, name: str, content: str, delay: float = 0.0):
+        def create(**kwargs):
+            time.sleep(delay)
+            return _chat_response(content)
+        self.clients[name].chat.completions.create.side_effect = create
+
+    def test_prefers_lowest_p50_once_known(self):
+        for _ in range(2):
+            self.router.record(("fast", "model-a"), 3.0, ok=True)
+            self.router.record(("slow", "model-b"), 1.0, ok=True)
+
+        self.assertEqual(self.router.rank("chat"), [("slow", "model-b"), ("fast", "model-a")])
+
+    def test_unhealthy_route_ranked_last(self):
+        for _ in range(2):
+            self.router.record(("fast", "model-a"), 0.1, ok=False)
+            self.router.record(("slow", "model-b"), 2.0, ok=True)
+
+        self.assertEqual(self.router.rank("chat")[0], ("slow", "model-b"))
+        self.assertEqual(self.router.route_stats(("fast", "model-a"))["error_rate"], 1.0)
+
+    def test_routes_without_api_key_are_skipped(self):
+        with patch.dict(os.environ, {"SLOW_KEY": ""}):
+            self.assertEqual(self.router.rank("chat"), [("fast", "model-a")])
+
+    def test_fails_over_to_next_route(self):
+        self.clients["fast"].chat.completions.create.side_effect = RuntimeError("overloaded")
+        self._answer("slow", "from slow")
+
+        self.assertEqual(self.router.complete("chat", messages=[]), "from slow")
+        self.assertEqual(self.router.route_stats(("fast", "model-a"))["error_rate"], 1.0)
+
+    def test_hedges_when_first_route_is_slower_than_its_p95(self):
+        for _ in range(2):
+            self.router.record(("fast", "model-a"), 0.05, ok=True)
+        self._answer("fast", "from fast", delay=1.0)
+        self._answer("slow", "from slow")
+
+        started_at = time.time()
+        content = self.router.complete("chat", messages=[])
+
+        self.assertEqual(content, "from slow")
+        self.assertLess(time.time() - started_at, 0.9)
+        self.assertEqual(self.clients["slow"].chat.completions.create.call_args.kwargs["model"], "model-b")
+
+    def test_all_routes_failing_raises(self):
+        for client in self.clients.values():
+            client.chat.completions.create.side_effect = RuntimeError("down")
+
+        with self.assertRaises(RuntimeError):
+            self.router.complete("chat", messages=[])
+
+    def _stream(self, name: str, chunks, delay: float = 0.0):
+        def create(**kwargs):
+            def stream():
+                time.sleep(delay)
+                for chunk in chunks:
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+            return stream()
+        self.clients[name].chat.completions.create.side_effect = create
+
+    def _streamed_text(self):
+        return [
+            (route[0], chunk.choices[0].delta.content)
+            for route, chunk in self.router.stream("chat", {"messages": []})
+        ]
+
+    def test_stream_fails_over_before_first_content(self):
+        self._stream("fast", [_stream_chunk(content=None), RuntimeError("overloaded")])
+        self._stream("slow", [_stream_chunk(content="from slow")])
+
+        self.assertEqual(self._streamed_text(), [("slow", "from slow")])
+        self.assertEqual(self.router.route_stats(("fast", "model-a"))["error_rate"], 1.0)
+        self.assertEqual(self.router.route_stats(("slow", "model-b"))["samples"], 1)
+
+    def test_stream_hedges_on_time_to_first_token(self):
+        for _ in range(2):
+            self.router.record(("fast", "model-a"), 0.05, ok=True)
+        self._stream("fast", [_stream_chunk(content="from fast")], delay=1.0)
+        self._stream("slow", [_stream_chunk(content="from slow"), _stream_chunk(content=" again")])
+
+        started_at = time.time()
+        text = self._streamed_text()
+
+        self.assertEqual(text, [("slow", "from slow"), ("slow", " again")])
+        self.assertLess(time.time() - started_at, 0.9)
+
+    def test_stream_error_after_content_is_raised(self):
+        self._stream("fast", [_stream_chunk(content="partial"), RuntimeError("connection reset")])
+        self._stream("slow", [_stream_chunk(content="from slow")])
+
+        with self.assertRaisesRegex(RuntimeError, "connection reset"):
+            self._streamed_text()
+        self.clients["slow"].chat.completions.create.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
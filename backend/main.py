@@ -1,13 +1,13 @@
-import time
 from datetime import datetime
 
 from backend.integrations.openrank import get_openrank_score_for_fid
 from backend.integrations.vercel_api import VercelApi
 from backend.types import UserContext
+from backend.utils.admission import admit_job, release_job_slot, too_many_requests
 from backend.utils.sentry import setup_sentry
 import modal
 
-from backend.modal import app, volumes, all_secrets, db_secrets
+from backend.modal import app, volumes, all_secrets, db_secrets, kv_secrets
 from backend import config
 from backend.integrations.db import Database
 from typing import Optional
@@ -35,7 +35,7 @@ def enhance_context_endpoint(data: dict) -> dict:
         return {"error": f"Context enhancement failed: {str(e)}"}, 500
 
 
-@app.function(secrets=db_secrets)
+@app.function(secrets=db_secrets + kv_secrets)
 @modal.web_endpoint(label="create-project-webhook", method="POST", docs=True)
 def create_project_webhook(data: dict) -> dict:
     """
@@ -47,21 +47,30 @@ def create_project_webhook(data: dict) -> dict:
         if field not in data:
             return {"error": f"Missing required field: {field}"}, 400
 
-    db = Database()
-    project_id = db.create_project(
-        fid_owner=data["user_context"]["fid"],
-        repo_url="",
-        frontend_url="",
-    )
+    admission = admit_job(data["user_context"]["fid"])
+    if not admission["admitted"]:
+        return too_many_requests(admission)
 
-    job_id = db.create_job(project_id=project_id, job_type="setup_project", data=data)
+    try:
+        db = Database()
+        project_id = db.create_project(
+            fid_owner=data["user_context"]["fid"],
+            repo_url="",
+            frontend_url="",
+        )
 
-    setup_project_data = {
-        "project_id": project_id,
-        "job_id": job_id,
-        "data": data,
-    }
-    setup_project.spawn(setup_project_data)
+        job_id = db.create_job(project_id=project_id, job_type="setup_project", data=data)
+
+        setup_project_data = {
+            "project_id": project_id,
+            "job_id": job_id,
+            "data": data,
+            "admission_slot": admission["slot"],
+        }
+        setup_project.spawn(setup_project_data)
+    except Exception:
+        release_job_slot(admission["slot"])
+        raise
     return {
         "status": "pending",
         "project_id": project_id,
@@ -70,7 +79,7 @@ def create_project_webhook(data: dict) -> dict:
     }
 
 
-@app.function()
+@app.function(secrets=kv_secrets)
 @modal.web_endpoint(label="farcaster-webhook", docs=True, method="POST")
 def handle_farcaster_webhook(data: dict) -> dict:
     # import os
@@ -86,7 +95,19 @@ def handle_farcaster_webhook(data: dict) -> dict:
         text = data.get("data", {}).get("text", "").lower().strip()
         is_build_command = text.startswith('create') or text.startswith('build')
         if is_build_command:
-            create_project_from_cast.spawn(data)
+            from backend.integrations.kv import claim_once, release_claim
+
+            # Neynar retries and duplicate deliveries carry the same cast hash
+            dedup_key = f"farcaster-webhook:cast:{data['data'].get('hash')}"
+            if data["data"].get("hash") and not claim_once(dedup_key, config.WEBHOOK_DEDUP["TTL"]):
+                print(f"ignoring duplicate delivery for {dedup_key}")
+                return {"status": "duplicate"}
+
+            try:
+                create_project_from_cast.spawn(data)
+            except Exception:
+                release_claim(dedup_key)
+                raise
             return {"status": "success"}
     return {"status": "ignored"}
 
@@ -133,66 +154,50 @@ def create_project_from_cast(data: dict):
             "message": "User does not meet minimum requirements to create a project",
         }
 
+    admission = admit_job(user_fid)
+    if not admission["admitted"]:
+        print(f"not creating project for fid {user_fid}: {admission}")
+        NeynarPost().reply_to_cast(
+            text=f"{admission['reason'].lower()}, try again in {max(1, round(admission['retry_after'] / 60))} min",
+            parent_hash=cast["hash"],
+            parent_fid=user_fid,
+        )
+        return {"status": "rate_limited", "retry_after": admission["retry_after"]}
+
     prompt = get_prompt_from_conversation(conversation)
     user_context = cast["author"]
     payload = dict(
         prompt=prompt,
         user_context=user_context,
     )
-    db = Database()
-    project_id = db.create_project(
-        fid_owner=user_fid,
-        repo_url="",
-        frontend_url="",
-        data={"cast": cast, **payload},
-    )
-    job_id = db.create_job(
-        project_id=project_id,
-        job_type="setup_project",
-        data=payload,
-    )
-
-    setup_project.spawn(
-        {
-            "project_id": project_id,
-            "job_id": job_id,
-            "data": payload,
-        }
-    )
-
-    print(
-        "spawned create_project function. sleeping for 30 seconds before replying to cast"
-    )
-    # Wait for initial processing before responding
-    time.sleep(30)
     try:
-        project = db.get_project(project_id)
-        text = f"""🚀 Your project is being created! Track status here: {config.FRONTEND_URL}
-        message @hellno for support"""
-        embeds = [
+        db = Database()
+        project_id = db.create_project(
+            fid_owner=user_fid,
+            repo_url="",
+            frontend_url="",
+            data={"cast": cast, **payload},
+        )
+        job_id = db.create_job(
+            project_id=project_id,
+            job_type="setup_project",
+            data=payload,
+        )
+
+        # setup replies to the cast as soon as the repo exists, see reply_to_cast_with_project
+        setup_project.spawn(
             {
-                "url": config.FRONTEND_URL,
+                "project_id": project_id,
+                "job_id": job_id,
+                "data": payload,
+                "reply_to_cast": {"hash": cast["hash"], "fid": user_fid},
+                "admission_slot": admission["slot"],
             }
-        ]
-
-        repo_url = project.get("repo_url")
-        if repo_url:
-            text += f"\n🔗 open source repo: {repo_url}"
-            embeds.append(
-                {
-                    "url": repo_url,
-                }
-            )
-
-        NeynarPost().reply_to_cast(
-            text=text,
-            parent_hash=cast["hash"],
-            parent_fid=user_fid,
-            embeds=embeds,
         )
-    except Exception as e:
-        print("Failed to reply to cast", e)
-        return {"error": "Failed to reply to cast", "message": f"{str(e)}"}, 500
+    except Exception:
+        release_job_slot(admission["slot"])
+        raise
+    print("spawned create_project function, it replies to the cast once the repo is created")
 
     return {
         "status": "pending",
@@ -218,29 +223,89 @@ def setup_project(data: dict) -> dict:
     job_id = data["job_id"]
     user_payload = data["data"]
 
-    SetupProjectService(project_id, job_id, user_payload).run()
+    try:
+        SetupProjectService(
+            project_id, job_id, user_payload, reply_to_cast=data.get("reply_to_cast")
+        ).run()
+    finally:
+        release_job_slot(data.get("admission_slot"))
     return {"status": "core_setup_complete"}
 
 
-@app.function(secrets=db_secrets)
+@app.function(secrets=all_secrets, name=config.MODAL_REPLY_TO_CAST_FUNCTION_NAME)
+def reply_to_cast_with_project(project_id: str, cast_hash: str, fid: int):
+    """Reply to the cast that requested a project, spawned by setup once the repo exists"""
+    from backend.integrations.neynar import NeynarPost
+
+    db = Database()
+    try:
+        project = db.get_project(project_id)
+        text = f"""🚀 Your project is being created! Track status here: {config.FRONTEND_URL}
+        message @hellno for support"""
+        embeds = [
+            {
+                "url": config.FRONTEND_URL,
+            }
+        ]
+
+        repo_url = project.get("repo_url")
+        if repo_url:
+            text += f"\n🔗 open source repo: {repo_url}"
+            embeds.append(
+                {
+                    "url": repo_url,
+                }
+            )
+
+        NeynarPost().reply_to_cast(
+            text=text,
+            parent_hash=cast_hash,
+            parent_fid=fid,
+            embeds=embeds,
+        )
+    except Exception as e:
+        print("Failed to reply to cast", e)
+        return {"error": "Failed to reply to cast", "message": f"{str(e)}"}, 500
+
+    return {"status": "replied", "project_id": project_id}
+
+
+@app.function(secrets=db_secrets + kv_secrets)
 @modal.web_endpoint(label="update-code-webhook", method="POST", docs=True)
 def update_code_webhook(data: dict) -> dict:
     """
     Webhook that updates the code for a project.
     """
+    from backend.services.update_code_queue import UpdateCodeQueue
+
     print(f"received webhook data: {data}")
     required_fields = ["prompt", "project_id", "user_context"]
     for field in required_fields:
         if field not in data:
             return {"error": f"Missing required field: {field}"}, 400
 
-    db = Database()
-    job_id = db.create_job(
-        project_id=data["project_id"], job_type="update_code", data=data
-    )
-    data["job_id"] = job_id
+    admission = admit_job(data["user_context"]["fid"])
+    if not admission["admitted"]:
+        return too_many_requests(admission)
 
-    update_code.spawn(data)
+    try:
+        db = Database()
+        job_id = db.create_job(
+            project_id=data["project_id"], job_type="update_code", data=data
+        )
+        data["job_id"] = job_id
+        data["admission_slot"] = admission["slot"]
+        # prompts queued for the same project are merged into one run, see update_code
+        data["queued"], schedule_run = UpdateCodeQueue(data["project_id"]).push(job_id, data["prompt"])
+
+        if schedule_run:
+            update_code.spawn(data)
+        else:
+            print(f"job {job_id} queued for the update_code run already scheduled for the project")
+            release_job_slot(admission["slot"])
+    except Exception:
+        release_job_slot(admission["slot"])
+        raise
 
     return {
         "status": "pending",
@@ -283,6 +348,18 @@ def deploy_project_webhook(data: dict) -> dict:
     }
 
 
+def acquire_project_lock(project_id: str, job_id: str):
+    """Wait until earlier update and deploy jobs on the project are done, fails the job on timeout"""
+    from backend.exceptions import ProjectLockTimeoutError
+    from backend.services.project_lock import ProjectLock
+
+    try:
+        return ProjectLock(project_id, job_id).acquire()
+    except ProjectLockTimeoutError as e:
+        Database().update_job_status(job_id, "failed", e.message)
+        raise
+
+
 @app.function(
     volumes=volumes,
     timeout=config.TIMEOUTS["PROJECT_SETUP"],
@@ -299,7 +376,11 @@ def deploy_project(data: dict) -> dict:
     job_id = data["job_id"]
     user_context = data["user_context"]
 
-    DeployProjectService(project_id, job_id, user_context).run()
+    project_lock = acquire_project_lock(project_id, job_id)
+    try:
+        DeployProjectService(project_id, job_id, user_context, project_lock=project_lock).run()
+    finally:
+        project_lock.release()
     return {"status": "deployment_complete"}
 
 
@@ -310,7 +391,12 @@ def deploy_project(data: dict) -> dict:
     name=config.MODAL_UPDATE_CODE_FUNCTION_NAME,
 )
 def update_code(data: dict):
+    from backend.exceptions import ProjectLockTimeoutError
     from backend.services.code_service import CodeService
+    from backend.services.project_lock import ProjectLock
+    from backend.services.update_code_queue import (
+        UpdateCodeQueue, fail_queued_jobs, finish_merged_jobs, merge_update_prompts, start_merged_jobs,
+    )
 
     setup_sentry()
 
@@ -319,8 +405,46 @@ def update_code(data: dict):
     prompt = data["prompt"]
     user_context: UserContext = data["user_context"]
 
-    code_service = CodeService(project_id, job_id, user_context)
-    code_service.run(prompt)
+    queue = UpdateCodeQueue(project_id)
+    db = Database()
+    try:
+        if data.get("queued"):
+            if queue.is_empty():
+                print(f"prompt of job {job_id} already ran as part of an earlier job")
+                return "Code update merged into an earlier run"
+            # give a user sending several prompts in a row the chance to finish
+            queue.wait_for_quiet()
+        try:
+            project_lock = ProjectLock(project_id, job_id).acquire()
+        except ProjectLockTimeoutError as e:
+            # only fail prompts nobody ran, a job taken by an earlier run keeps its result
+            queued = queue.take_all() if data.get("queued") else None
+            failed_job_ids = [job["job_id"] for job in queued] if queued is not None else [job_id]
+            fail_queued_jobs(db, failed_job_ids, e.message)
+            raise
+        try:
+            jobs = queue.take_all() if data.get("queued") else None
+            if jobs == []:
+                print(f"prompt of job {job_id} already ran as part of an earlier job")
+                return "Code update merged into an earlier run"
+            jobs = jobs or [{"job_id": job_id, "prompt": prompt}]
+
+            primary_job_id = jobs[0]["job_id"]
+            merged_job_ids = [job["job_id"] for job in jobs[1:]]
+            start_merged_jobs(db, primary_job_id, merged_job_ids)
+            result = {"status": "error", "message": f"Job {primary_job_id} did not finish"}
+            try:
+                code_service = CodeService(project_id, primary_job_id, user_context, project_lock=project_lock)
+                try:
+                    result = code_service.run(merge_update_prompts([job["prompt"] for job in jobs]))
+                finally:
+                    code_service.close()
+            finally:
+                finish_merged_jobs(db, merged_job_ids, result)
+        finally:
+            project_lock.release()
+    finally:
+        release_job_slot(data.get("admission_slot"))
 
     return "Code update completed"
 
@@ -23,6 +23,7 @@ base_image = (
         "GitPython",
         "PyGithub",
         "openai",
+        "httpx[http2]",
         "supabase",
         "sentry-sdk[fastapi]",
         "redis",
@@ -60,6 +61,17 @@ volumes = {
     ),
 }
 
+# Build sandboxes share one content-addressed pnpm store so installs mostly resolve offline.
+# The store lives on another filesystem than /repo, so pnpm copies from it instead of
+# hard-linking, which keeps node_modules self-contained for filesystem snapshots.
+sandbox_volumes = {
+    config.PATHS["PNPM_STORE"]: volumes[config.PATHS["PNPM_STORE"]],
+}
+
+SANDBOX_ENV_VARS = {
+    "npm_config_store_dir": config.PATHS["PNPM_STORE"],
+}
+
 all_secrets = [
     modal.Secret.from_name("github-secret"),
     modal.Secret.from_name("vercel-secret"),
@@ -77,3 +89,7 @@ all_secrets = [
 db_secrets = [
     modal.Secret.from_name("supabase-secret"),
 ]
+
+kv_secrets = [
+    modal.Secret.from_name("upstash-secret"),
+]
@@ -7,7 +7,7 @@ from backend.exceptions import (
     BuildError, InstallError, CompileError,
     VercelBuildError, VercelAPIError
 )
-from backend.utils.package_commands import parse_sandbox_process
+from backend.utils.package_commands import parse_sandbox_process, parse_pnpm_store_stats
 from backend import config
 
 class BuildRunner:
@@ -18,8 +18,13 @@ class BuildRunner:
         self.db = db
         self.job_id = job_id
         
-    def run_build_in_sandbox(self, sandbox, terminate_after_build: bool = False) -> Tuple[bool, str]:
-        """Run build commands in a sandbox and return results"""
+    def run_build_in_sandbox(
+        self, sandbox, terminate_after_build: bool = False, install: bool = True
+    ) -> Tuple[bool, str]:
+        """Run build commands in a sandbox and return results.
+
+        install=False skips `pnpm install` for a sandbox whose dependencies are already installed.
+        """
         try:
             logs = []
             
@@ -36,18 +41,25 @@ class BuildRunner:
             print("[build] Latest commit:", log_lines)
             
             # Run installation
-            install_process = sandbox.exec("pnpm", "install")
-            install_logs, install_code = parse_sandbox_process(install_process)
-            logs.extend(install_logs)
-            
-            if install_code != 0:
-                logs_str = "\n".join(self._clean_log_lines(logs))
-                raise InstallError(self.job_id, self.project_id, Exception(f"Install failed with code {install_code}: {logs_str}"))
+            if install:
+                install_process = sandbox.exec("pnpm", "install")
+                install_logs, install_code = parse_sandbox_process(install_process)
+                logs.extend(install_logs)
+                self.report_install_store_stats(install_logs, "build install")
+
+                if install_code != 0:
+                    logs_str = "\n".join(self._clean_log_lines(logs))
+                    raise InstallError(self.job_id, self.project_id, Exception(f"Install failed with code {install_code}: {logs_str}"))
+            else:
+                print("[build] Dependencies already installed, skipping install")
                 
             # Run build
             print("[build] Running build command")
             build_process = sandbox.exec("pnpm", "build")
-            build_logs, build_returncode = parse_sandbox_process(build_process)
+            # the full build log goes to the job logs, only its tail is kept for error analysis
+            build_logs, build_returncode = parse_sandbox_process(
+                build_process, prefix="build", on_line=self._forward_build_line
+            )
             logs.extend(build_logs)
             
             # Check for errors
@@ -76,6 +88,24 @@ class BuildRunner:
                 self.db.update_job_status(self.job_id, "failed", error_msg)
             raise BuildError(self.job_id, self.project_id, e)
             
+    def _forward_build_line(self, stream: str, line: str):
+        if self.job_id:
+            self.db.add_log(self.job_id, "build", line)
+
+    def report_install_store_stats(self, install_logs: List[str], label: str):
+        """Log how much of a pnpm install was served from the shared package store"""
+        stats = parse_pnpm_store_stats(install_logs)
+        if not stats:
+            return
+
+        message = (
+            f"{label}: pnpm store hit rate {stats['hit_rate']:.0%} "
+            f"(reused {stats['reused']}, downloaded {stats['downloaded']})"
+        )
+        print(f"[build_runner] {message}")
+        if self.job_id:
+            self.db.add_log(self.job_id, "build", message)
+
     def generate_error_fix_prompt(self, logs: str) -> str:
         """Generate a prompt for the AI to fix build errors based on logs"""
         return f"""
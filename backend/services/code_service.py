@@ -4,21 +4,27 @@ import requests
 from typing import Optional, Tuple
 import git
 from aider.coders import Coder
-import tempfile
 from packaging.version import Version, parse as parse_version
 
 from backend import config
-from backend.modal import base_image
-from backend.integrations.db import Database
-from backend.integrations.github_api import (
-    clone_repo_url_to_dir,
-    configure_git_user_for_repo,
-)
+from backend.modal import base_image, sandbox_volumes, SANDBOX_ENV_VARS
+from backend.integrations.db import Database, get_connection_stats
+from backend.integrations.github_api import configure_git_user_for_repo
 
 from backend.types import UserContext
 from backend.services.aider_runner import AiderRunner
 from backend.utils.package_commands import handle_package_install_commands, parse_sandbox_process, extract_invalid_package_info, fix_invalid_package_version
 from backend.services.build_runner import BuildRunner
+from backend.services.repo_cache import RepoCache
+from backend.services.project_lock import ProjectLock
+from backend.services.sandbox_pool import sandbox_pool
+from backend.utils.sandbox_sync import sync_repo_to_sandbox
+from backend.services.dependency_image_cache import (
+    DependencyImageCache,
+    get_dependency_hash,
+    get_dependency_manifest_paths,
+    is_dependency_manifest,
+)
 from backend.exceptions import (
     CodeServiceError, SandboxError, SandboxCreationError, SandboxTerminationError,
     GitError, GitCloneError, GitPushError,
@@ -37,17 +43,25 @@ class CodeService:
         job_id: str,
         user_context: Optional[UserContext],
         manual_sandbox_termination: bool = False,
+        project_lock: Optional[ProjectLock] = None,
     ):
         self.project_id = project_id
         self.job_id = job_id
         self.user_context = user_context
         self.manual_sandbox_termination = manual_sandbox_termination
+        self.project_lock = project_lock
 
         self.sandbox = None
         self.repo_dir = None
+        self.repo_cache = RepoCache(project_id)
         self.db: Optional[Database] = None
         self.is_setup = False
         self.base_image_with_deps = None
+        self.dependency_hash = None
+        self.install_exit_code_unknown = False
+        # whether the sandbox's node_modules match the manifests last synced into it
+        self.dependencies_installed = False
+        self.dependency_image_cache = DependencyImageCache()
 
         self._setup()
 
@@ -275,6 +289,7 @@ class CodeService:
         """Generate final success response."""
         self.db.update_job_status(self.job_id, "completed")
         self.db.add_log(self.job_id, "system", "Code service process completed successfully")
+        self.db.flush_logs()
         print("[code_service] Code service process completed successfully")
 
         return {
@@ -303,6 +318,7 @@ class CodeService:
         self.db.update_job_status(self.job_id, "failed", error_msg)
         self._sync_git_changes()
         self.terminate_sandbox()
+        self.db.flush_logs()
 
         # Return error information instead of raising
         return {
@@ -318,6 +334,7 @@ class CodeService:
         # self.db.add_log(self.job_id, "backend", error_msg)
         self.db.update_job_status(self.job_id, "failed", error_msg)
         self.terminate_sandbox()
+        self.db.flush_logs()
 
         # Return error information instead of raising
         return {
@@ -328,19 +345,19 @@ class CodeService:
 
     def _get_build_logs(self) -> str:
         """Retrieve and format build logs for error analysis."""
-        build = self.db.get_latest_build(self.project_id)
-        if not build:
+        logs = self.db.get_latest_build_logs(self.project_id)
+        if logs is None:
             return "No build logs available"
-        return build.get("data", {}).get("logs", "No logs available")
+        return logs
 
     def terminate_sandbox(self):
-        """Safely terminate the sandbox if it exists."""
+        """Hand the sandbox back to the warm pool, which terminates it if the pool is full."""
         if self.sandbox:
             try:
-                print(f"[code_service] Terminating sandbox - job id {self.job_id}")
-                self.sandbox.terminate()
+                print(f"[code_service] Releasing sandbox - job id {self.job_id}")
+                sandbox_pool.release(self.sandbox)
                 self.sandbox = None
-                print("[code_service] Sandbox terminated")
+                print("[code_service] Sandbox released")
             except Exception as e:
                 error_msg = f"Error terminating sandbox job id {self.job_id}: {str(e)}"
                 print(error_msg)
@@ -354,6 +371,15 @@ class CodeService:
                         e
                     )
 
+    def close(self):
+        """Terminate the sandbox and hand the cached working copy to the next job."""
+        try:
+            self.terminate_sandbox()
+        finally:
+            self.repo_cache.release()
+            print(f"[code_service] sandbox pool metrics: {sandbox_pool.metrics()}")
+            print(f"[code_service] supabase connection stats: {get_connection_stats()}")
+
     # Context enhancement now handled by AiderRunner
 
     def _add_file_to_repo_dir(self, filename: str, content: str) -> None:
@@ -371,7 +397,8 @@ class CodeService:
         try:
             # Execute cat command to read file
             process = self.sandbox.exec("cat", filename)
-            logs, exit_code = parse_sandbox_process(process)
+            # the whole file is needed, not just the tail kept for log output
+            logs, exit_code = parse_sandbox_process(process, max_lines=None)
 
             if exit_code == 0:
                 return "\n".join(logs)
@@ -387,13 +414,12 @@ class CodeService:
 
         print("[code_service] Setting up CodeService")
         self.db = Database()
-        self.repo_dir = tempfile.mkdtemp()
 
         try:
             project = self.db.get_project(self.project_id)
             repo_url = project["repo_url"]
-            repo = clone_repo_url_to_dir(repo_url, self.repo_dir)
-            configure_git_user_for_repo(repo)
+            self.repo_dir = self.repo_cache.checkout(repo_url)
+            configure_git_user_for_repo(git.Repo(self.repo_dir))
 
             self.is_setup = True
             print("[code_service] CodeService setup complete")
@@ -506,6 +532,10 @@ class CodeService:
                 print("[code_service] Committing changes to git")
                 self._create_commit("automatic changes")
 
+            # a job that lost the project to a newer one must not push over its work
+            if self.project_lock:
+                self.project_lock.check()
+
             # Push changes
             repo.git.push("origin", "main")
         except git.GitCommandError as e:
@@ -525,8 +555,13 @@ class CodeService:
         print("[code_service] Running install command")
         process = self.sandbox.exec("pnpm", "install")
         logs, exit_code = parse_sandbox_process(process)
+        self._report_install_store_stats(logs, "sandbox install")
         return exit_code
 
+    def _report_install_store_stats(self, install_logs: list, label: str):
+        build_runner = BuildRunner(self.project_id, self.db, self.job_id)
+        build_runner.report_install_store_stats(install_logs, label)
+
     def get_git_repo_status(self) -> Tuple[bool, bool]:
         if not self.sandbox:
             print('error getting git repo status, sandbox not initialized')
@@ -543,7 +578,9 @@ class CodeService:
             self._create_sandbox(repo_dir=self.repo_dir)
 
             build_runner = BuildRunner(self.project_id, self.db, self.job_id)
-            has_error_in_logs, logs_str = build_runner.run_build_in_sandbox(self.sandbox)
+            has_error_in_logs, logs_str = build_runner.run_build_in_sandbox(
+                self.sandbox, install=not self.dependencies_installed
+            )
 
             print(f'terminate_after_build {terminate_after_build} manual_sandbox_termination {self.manual_sandbox_termination}')
             if terminate_after_build and not self.manual_sandbox_termination:
@@ -566,6 +603,34 @@ class CodeService:
             self.db.update_job_status(self.job_id, "failed", error_msg)
             raise BuildError(self.job_id, self.project_id, e)
 
+    def _get_base_image_with_deps(self, repo_dir: str) -> modal.Image:
+        """Reuse a cached dependency image for these manifests or build and cache a new one."""
+        self.dependency_hash = get_dependency_hash(repo_dir)
+        image = self.dependency_image_cache.get(self.dependency_hash)
+        if image:
+            self.db.add_log(self.job_id, "system", "Reusing cached dependency image")
+            return image
+
+        self.install_exit_code_unknown = False
+        image = self._create_base_image_with_deps(repo_dir)
+        # hash again, the install may have fixed package versions in package.json.
+        # Only the fixed manifests are cached: a hit on the broken ones would skip the fix.
+        self.dependency_hash = get_dependency_hash(repo_dir)
+        if self.install_exit_code_unknown:
+            print("[code_service] not caching dependency image, install exit code unknown")
+        else:
+            self.dependency_image_cache.put(self.dependency_hash, image)
+        return image
+
+    def _dependency_manifest_image(self, repo_dir: str) -> modal.Image:
+        """Base image with only the dependency manifests, so its snapshot is reusable across projects."""
+        image = base_image
+        for filename in get_dependency_manifest_paths(repo_dir):
+            image = image.add_local_file(
+                os.path.join(repo_dir, filename), remote_path=f"/repo/{filename.replace(os.sep, '/')}"
+            )
+        return image
+
     def _create_base_image_with_deps(self, repo_dir: str) -> modal.Image:
         """Create a base image with dependencies installed."""
         print("[code_service] Creating base sandbox for dependency installation")
@@ -577,10 +642,12 @@ class CodeService:
         try:
             base_sandbox = modal.Sandbox.create(
                 app=app,
-                image=base_image.add_local_dir(repo_dir, remote_path="/repo"),
+                image=self._dependency_manifest_image(repo_dir),
                 cpu=4,
                 memory=2048,
                 workdir="/repo",
+                volumes=sandbox_volumes,
+                env=SANDBOX_ENV_VARS,
                 # timeout=config.TIMEOUTS["BUILD"],
             )
 
@@ -593,11 +660,13 @@ class CodeService:
                 install_logs, exit_code = parse_sandbox_process(
                     process, prefix="base install"
                 )
+                self._report_install_store_stats(install_logs, "base install")
                 print("[code_service] base install process completed with exit code:", exit_code)
 
                 # Check if we got a valid exit code
                 if exit_code == -1:
                     print("[code_service] Warning: Could not determine exit code, proceeding with caution")
+                    self.install_exit_code_unknown = True
                 elif exit_code != 0:
                     logs_str = "\n".join(install_logs[:50]) + "..." if len(install_logs) > 50 else "\n".join(install_logs)
 
@@ -645,15 +714,18 @@ class CodeService:
                                 # Create a new sandbox and retry
                                 base_sandbox = modal.Sandbox.create(
                                     app=app,
-                                    image=base_image.add_local_dir(repo_dir, remote_path="/repo"),
+                                    image=self._dependency_manifest_image(repo_dir),
                                     cpu=4,
                                     memory=2048,
                                     workdir="/repo",
+                                    volumes=sandbox_volumes,
+                                    env=SANDBOX_ENV_VARS,
                                 )
                                 
                                 # Try installation again, this might also have errors
                                 process = base_sandbox.exec("pnpm", "install")
                                 retry_logs, retry_exit_code = parse_sandbox_process(process, prefix="retry install")
+                                self._report_install_store_stats(retry_logs, "retry install")
                                 
                                 if retry_exit_code == 0:
                                     print("[code_service] Retry installation succeeded")
@@ -713,7 +785,7 @@ class CodeService:
                     print(f"[code_service] Failed to terminate base sandbox: {str(e)}")
 
     def _create_sandbox(self, repo_dir: str):
-        """Create a sandbox using the cached base image if available."""
+        """Lease a warm sandbox for the repo's dependency image and sync the working tree into it."""
         # Validate package.json exists before proceeding
         package_json_path = os.path.join(repo_dir, "package.json")
         if not os.path.exists(package_json_path):
@@ -722,24 +794,37 @@ class CodeService:
             raise SandboxCreationError(self.job_id, self.project_id, Exception(error_msg))
         
         try:
-            app = modal.App.lookup(config.APP_NAME)
-
             if not self.base_image_with_deps:
-                self.base_image_with_deps = self._create_base_image_with_deps(repo_dir)
+                self.base_image_with_deps = self._get_base_image_with_deps(repo_dir)
 
-            self.sandbox = modal.Sandbox.create(
-                app=app,
-                image=self.base_image_with_deps.add_local_dir(
-                    repo_dir, remote_path="/repo"
-                ),
-                cpu=2,
-                memory=1024,
-                workdir="/repo",
-                # timeout=config.TIMEOUTS["BUILD"],
+            if self.sandbox and not sandbox_pool.is_usable(self.sandbox):
+                print("[code_service] Sandbox expired, leasing a new one")
+                sandbox_pool.release(self.sandbox, reusable=False)
+                self.sandbox = None
+
+            if not self.sandbox:
+                self.sandbox = sandbox_pool.lease(
+                    self.dependency_hash, self.base_image_with_deps
+                )
+                self.sandbox.set_tags({"project_id": self.project_id, "job_id": self.job_id})
+                # the image was installed from the manifests its hash covers
+                self.dependencies_installed = not self.install_exit_code_unknown
+
+            sync_stats = sync_repo_to_sandbox(self.sandbox, repo_dir)
+            self.db.add_log(
+                self.job_id,
+                "system",
+                f"Synced {sync_stats['changed']} changed and {sync_stats['deleted']} deleted files "
+                f"({sync_stats['bytes']} bytes) into sandbox",
             )
-            self.sandbox.set_tags({"project_id": self.project_id, "job_id": self.job_id})
-            self._run_install_in_sandbox()
-            print("[code_service] Sandbox created")
+            if any(
+                is_dependency_manifest(path)
+                for path in sync_stats["changed_paths"] + sync_stats["deleted_paths"]
+            ):
+                self.dependencies_installed = self._run_install_in_sandbox() == 0
+            else:
+                print("[code_service] Dependency manifests unchanged, skipping install")
+            print("[code_service] Sandbox ready")
         except Exception as e:
             print(f"[code_service] Failed to create sandbox: {str(e)}")
             raise SandboxCreationError(self.job_id, self.project_id, e)
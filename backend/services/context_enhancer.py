@@ -1,12 +1,13 @@
 import os
+import threading
 from typing import Optional
 from backend.integrations.llm import (
     generate_search_queries_from_user_input,
 )
 from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.llms.openai import OpenAI
 from llama_index.llms.openai.utils import DEFAULT_OPENAI_API_BASE
 from llama_index.core import (
+    QueryBundle,
     SimpleDirectoryReader,
     VectorStoreIndex,
     Settings,
@@ -15,17 +16,13 @@ from llama_index.core import (
 )
 
 from backend.config import CODE_CONTEXT
+from backend.services.docs_vector_store import DocsVectorStore, write_vector_store
 
 embed_model = OpenAIEmbedding(
     model="text-embedding-3-small",
     api_base=DEFAULT_OPENAI_API_BASE,
     api_key=os.environ.get("REAL_OPENAI_API_KEY"),
 )
-model = OpenAI(
-    model="gpt-4o-mini",
-    api_base=DEFAULT_OPENAI_API_BASE,
-    api_key=os.environ.get("REAL_OPENAI_API_KEY"),
-)
 
 Settings.embed_model = embed_model
 
@@ -33,10 +30,124 @@ PARENT_UPDATE_DOC = "shared.md"
 CONTEXT_DOCS_PATH = "backend/llm_context/docs"
 INDEX_STORAGE_PATH = "backend/llm_context/index"
 
+# One index per container, shared by every CodeContextEnhancer.
+# Maps a key to (fingerprint, value); entries are only ever replaced as a whole.
+_index_lock = threading.Lock()
+_index_cache = {}
+
+
+def _get_index_fingerprint() -> tuple:
+    """Name, mtime and size of every persisted index file, changes whenever the index is rewritten"""
+    try:
+        return tuple(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in sorted(os.scandir(INDEX_STORAGE_PATH), key=lambda entry: entry.name)
+            if entry.is_file()
+        )
+    except FileNotFoundError:
+        return ()
+
+
+def _get_cached(key: str, load):
+    """Value loaded from the index files, loaded once and reloaded only if the files on disk change"""
+    fingerprint = _get_index_fingerprint()
+    # a single read, so a concurrent reload or reset can't remove the entry between check and use
+    entry = _index_cache.get(key)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+
+    with _index_lock:
+        # another thread may have loaded it while we waited
+        fingerprint = _get_index_fingerprint()
+        entry = _index_cache.get(key)
+        if entry is None or entry[0] != fingerprint:
+            value = load()
+            # building the index persists it, so take the fingerprint after loading
+            entry = (_get_index_fingerprint(), value)
+            _index_cache[key] = entry
+        return entry[1]
+
+
+def _reset_cache():
+    with _index_lock:
+        _index_cache.clear()
+
+
+def get_vector_store() -> Optional[DocsVectorStore]:
+    """Compact docs vector store, None until it has been written next to the index"""
+    return _get_cached("vector_store", lambda: DocsVectorStore.load(INDEX_STORAGE_PATH))
+
+
+def get_retriever():
+    """Retriever over the llama-index docs index, used while no compact vector store exists.
+
+    Only the scored source nodes are used, so no LLM synthesizes an answer from them.
+    """
+    return _get_cached(
+        "retriever",
+        lambda: _load_index().as_retriever(similarity_top_k=CODE_CONTEXT["TOP_K"]),
+    )
+
+
+def export_vector_store(index: VectorStoreIndex):
+    """Write the nodes and embeddings of a llama-index index as a compact vector store"""
+    embeddings, file_names, file_sizes, texts = [], [], [], []
+    for node_id in index.index_struct.nodes_dict:
+        node = index.docstore.get_node(node_id)
+        embeddings.append(index.vector_store.get(node_id))
+        file_names.append(node.metadata.get("file_name") or "")
+        file_sizes.append(node.metadata.get("file_size") or 0)
+        texts.append(node.text)
+
+    write_vector_store(
+        INDEX_STORAGE_PATH,
+        embeddings,
+        file_names,
+        file_sizes,
+        texts,
+        dtype=CODE_CONTEXT["EMBEDDING_DTYPE"],
+    )
+    print(f"Vector store with {len(texts)} nodes written to {INDEX_STORAGE_PATH}")
+
+
+def reciprocal_rank_fusion(results: list[list[dict]], k: int = 60) -> list[dict]:
+    """Merge ranked node lists into one, ordered by the sum of 1 / (k + rank) over the lists"""
+    fused = {}
+    for nodes in results:
+        for rank, node in enumerate(nodes, start=1):
+            key = (node["file_name"], node["text"])
+            entry = fused.setdefault(key, dict(node, fused_score=0.0))
+            entry["fused_score"] += 1.0 / (k + rank)
+            entry["score"] = max(entry["score"], node["score"])
+    return sorted(fused.values(), key=lambda node: node["fused_score"], reverse=True)
+
+
+def _load_index() -> VectorStoreIndex:
+    """Dynamically load context pieces from docs directory structure."""
+    try:
+        storage_context = StorageContext.from_defaults(
+            persist_dir=INDEX_STORAGE_PATH
+        )
+        index = load_index_from_storage(storage_context)
+        print(f"Index loaded from {INDEX_STORAGE_PATH}")
+    except Exception as e:
+        print(f"Error loading index: {e}")
+        documents = SimpleDirectoryReader(
+            input_dir=CONTEXT_DOCS_PATH, recursive=True
+        ).load_data()
+
+        # Build a vector index
+        index = VectorStoreIndex.from_documents(documents)
+        index.storage_context.persist(persist_dir=INDEX_STORAGE_PATH)
+        export_vector_store(index)
+        print(f"Index created and stored at {INDEX_STORAGE_PATH}")
+    return index
+
 
 class CodeContextEnhancer:
-    def __init__(self):
-        self._prepare_query_engine()
+    @property
+    def retriever(self):
+        return get_retriever()
 
     def get_relevant_context(self, user_input: str) -> Optional[str]:
         """Retrieve context using generated technical queries."""
@@ -48,24 +159,26 @@ class CodeContextEnhancer:
             if not user_input or not user_input.strip():
                 return None
             queries = generate_search_queries_from_user_input(user_input=user_input)
-            filename_to_context = dict()
-            for q in queries:
-                response = self.query_engine.query(q)
-                nodes = [
-                    {
-                        'file_name': node.metadata.get('file_name'),
-                        'file_size': node.metadata.get('file_size'),
-                        'score': node.score
-                    }
-                    for node in response.source_nodes
+            if not queries:
+                return None
+
+            results = self._retrieve(queries)
+            for q, nodes in zip(queries, results):
+                scored = [
+                    {'file_name': node['file_name'], 'file_size': node['file_size'], 'score': node['score']}
+                    for node in nodes
                 ]
-                print(f"Search query: {q}, Nodes: {nodes}")
-                for node in response.source_nodes:
-                    if node.score > CODE_CONTEXT["MIN_RAG_SCORE"]:
-                        filename = node.metadata.get("file_name")
-                        filename_to_context[filename] = node.text
+                print(f"Search query: {q}, Nodes: {scored}")
+
+            relevant = [
+                [node for node in nodes if node["score"] > CODE_CONTEXT["MIN_RAG_SCORE"]]
+                for nodes in results
+            ]
+            filename_to_context = dict()
+            for node in reciprocal_rank_fusion(relevant)[:CODE_CONTEXT["MAX_CONTEXT_NODES"]]:
+                filename_to_context.setdefault(node["file_name"], node["text"])
 
-            unique_texts = list(set(filename_to_context.values()))
+            unique_texts = list(dict.fromkeys(filename_to_context.values()))
             if not unique_texts:
                 print("No relevant context found.")
                 return None
@@ -78,27 +191,32 @@ class CodeContextEnhancer:
             print(f"Failed to query context: {e}")
             return None
 
-    def _prepare_query_engine(self):
-        """Dynamically load context pieces from docs directory structure."""
+    def _retrieve(self, queries: list[str]) -> list[list[dict]]:
+        """Most similar doc nodes for each query, as dicts with file_name, file_size, score and text.
 
-        try:
-            storage_context = StorageContext.from_defaults(
-                persist_dir=INDEX_STORAGE_PATH
-            )
-            index = load_index_from_storage(storage_context)
-            print(f"Index loaded from {INDEX_STORAGE_PATH}")
-        except Exception as e:
-            print(f"Error loading index: {e}")
-            documents = SimpleDirectoryReader(
-                input_dir=CONTEXT_DOCS_PATH, recursive=True
-            ).load_data()
+        All queries are embedded in one request and searched in one pass.
+        """
+        query_embeddings = embed_model.get_text_embedding_batch(queries)
 
-            # Build a vector index
-            index = VectorStoreIndex.from_documents(documents)
-            index.storage_context.persist(persist_dir=INDEX_STORAGE_PATH)
-            print(f"Index created and stored at {INDEX_STORAGE_PATH}")
+        vector_store = get_vector_store()
+        if vector_store is None:
+            return [
+                [
+                    {
+                        "file_name": node.metadata.get("file_name"),
+                        "file_size": node.metadata.get("file_size"),
+                        "score": node.score,
+                        "text": node.text,
+                    }
+                    for node in self.retriever.retrieve(QueryBundle(query, embedding=embedding))
+                ]
+                for query, embedding in zip(queries, query_embeddings)
+            ]
 
-        self.query_engine = index.as_query_engine(llm=model, query_kwargs={"top_k": 2})
+        return [
+            [dict(vector_store.get_node(row), score=score) for row, score in matches]
+            for matches in vector_store.search(query_embeddings, top_k=CODE_CONTEXT["TOP_K"])
+        ]
 
     def refresh_persisted_index(self):
         """Rebuild and persist the context index."""
@@ -109,4 +227,7 @@ class CodeContextEnhancer:
         # Build a vector index
         index = VectorStoreIndex.from_documents(documents)
         index.storage_context.persist(persist_dir=INDEX_STORAGE_PATH)
+        export_vector_store(index)
         print(f"Index refreshed and stored at {INDEX_STORAGE_PATH}")
+
+        _reset_cache()
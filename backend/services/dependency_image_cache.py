@@ -0,0 +1,109 @@
+"""
+Content-addressed cache of sandbox images with project dependencies installed
+"""
+import hashlib
+import os
+import time
+from typing import Optional
+
+import modal
+
+from backend import config
+
+# Files that fully determine the result of `pnpm install`
+DEPENDENCY_MANIFEST_FILES = [
+    "package.json",
+    "pnpm-lock.yaml",
+    "pnpm-workspace.yaml",
+    ".npmrc",
+    ".pnpmfile.cjs",
+]
+# Directories whose files are install inputs too, e.g. `pnpm patch` output
+DEPENDENCY_MANIFEST_DIRS = ["patches"]
+
+
+def get_dependency_manifest_paths(repo_dir: str) -> list[str]:
+    """Relative paths of the install inputs present in the repo, in a stable order"""
+    paths = [
+        filename
+        for filename in DEPENDENCY_MANIFEST_FILES
+        if os.path.isfile(os.path.join(repo_dir, filename))
+    ]
+    for dirname in DEPENDENCY_MANIFEST_DIRS:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(repo_dir, dirname)):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), repo_dir))
+    return paths
+
+
+def is_dependency_manifest(path: str) -> bool:
+    """Whether a repo relative path (optionally ./ prefixed) is an install input"""
+    path = path[2:] if path.startswith("./") else path
+    return path in DEPENDENCY_MANIFEST_FILES or any(
+        path.startswith(dirname + "/") for dirname in DEPENDENCY_MANIFEST_DIRS
+    )
+
+
+def get_dependency_hash(repo_dir: str) -> str:
+    """Hash of the dependency manifests, the key for a cached dependency image"""
+    digest = hashlib.sha256(
+        f"v{config.DEPENDENCY_IMAGE_CACHE['VERSION']}".encode()
+    )
+    for filename in get_dependency_manifest_paths(repo_dir):
+        digest.update(filename.encode())
+        with open(os.path.join(repo_dir, filename), "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+class DependencyImageCache:
+    """Maps dependency hashes to snapshot image ids in a Modal Dict shared by all containers.
+
+    All operations are best effort: if the index is unreachable the caller
+    simply builds the image again.
+    """
+
+    def __init__(self, dict_name: str = config.DEPENDENCY_IMAGE_CACHE["DICT_NAME"]):
+        self.dict_name = dict_name
+        self._index = None
+
+    def get(self, deps_hash: str) -> Optional[modal.Image]:
+        if not config.DEPENDENCY_IMAGE_CACHE["ENABLED"]:
+            return None
+
+        try:
+            entry = self._get_index().get(deps_hash)
+            if not entry:
+                print(f"[dependency_image_cache] miss for {deps_hash[:12]}")
+                return None
+
+            if time.time() - entry["created_at"] > config.DEPENDENCY_IMAGE_CACHE["MAX_AGE"]:
+                print(f"[dependency_image_cache] entry for {deps_hash[:12]} expired")
+                self._get_index().pop(deps_hash, None)
+                return None
+
+            image = modal.Image.from_id(entry["image_id"])
+            image.hydrate()
+            print(f"[dependency_image_cache] hit for {deps_hash[:12]}: {entry['image_id']}")
+            return image
+        except Exception as e:
+            print(f"[dependency_image_cache] lookup failed for {deps_hash[:12]}: {e}")
+            return None
+
+    def put(self, deps_hash: str, image: modal.Image):
+        if not config.DEPENDENCY_IMAGE_CACHE["ENABLED"]:
+            return
+
+        try:
+            self._get_index().put(
+                deps_hash, {"image_id": image.object_id, "created_at": time.time()}
+            )
+            print(f"[dependency_image_cache] stored {image.object_id} for {deps_hash[:12]}")
+        except Exception as e:
+            print(f"[dependency_image_cache] failed to store {deps_hash[:12]}: {e}")
+
+    def _get_index(self) -> modal.Dict:
+        if self._index is None:
+            self._index = modal.Dict.from_name(self.dict_name, create_if_missing=True)
+        return self._index
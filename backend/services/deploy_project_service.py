@@ -3,8 +3,10 @@ import time
 import requests
 import json
 from datetime import datetime
+from typing import Optional
 from backend.integrations.db import Database
 from backend.services.code_service import CodeService
+from backend.services.project_lock import ProjectLock
 from backend.services.vercel_build_service import VercelBuildService
 from backend.utils.farcaster import generate_domain_association
 from backend.types import UserContext
@@ -14,13 +16,19 @@ DEPLOYMENT_COMPLETE_COMMIT_MESSAGE = "Deployment complete"
 
 
 class DeployProjectService:
-    def __init__(self, project_id: str, job_id: str, user_context: UserContext):
+    def __init__(
+        self,
+        project_id: str,
+        job_id: str,
+        user_context: UserContext,
+        project_lock: Optional[ProjectLock] = None,
+    ):
         self.project_id = project_id
         self.job_id = job_id
         self.user_context = user_context
         self.db = Database()
         self.project = self.db.get_project(project_id)
-        self.code_service = CodeService(project_id, job_id, user_context)
+        self.code_service = CodeService(project_id, job_id, user_context, project_lock=project_lock)
         self.vercel_service = VercelBuildService(project_id)
 
     def run(self):
@@ -63,12 +71,13 @@ class DeployProjectService:
                     parent_fid=user_fid,
                     embeds=[{"url": url}],
                 )
-            self.code_service.terminate_sandbox()
         except Exception as e:
-            self.code_service.terminate_sandbox()
             self._log(f"Deployment failed: {str(e)}", "error")
             self.db.update_project(self.project_id, {"status": "deploy_failed"})
             raise
+        finally:
+            self.code_service.close()
+            self.db.flush_logs()
 
     def _update_metadata(self):
         """Update metadata in code to reflect project setup"""
@@ -0,0 +1,107 @@
+"""
+Compact on-disk vector store for the docs index: a normalized embedding matrix plus an array-backed node table
+"""
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.npy"
+NODES_FILE = "nodes.npz"
+TEXTS_FILE = "texts.bin"
+
+
+def write_vector_store(
+    directory: str,
+    embeddings: Sequence[Sequence[float]],
+    file_names: Sequence[str],
+    file_sizes: Sequence[int],
+    texts: Sequence[str],
+    dtype: str = "float16",
+):
+    """Persist nodes and their embeddings, rows normalized so a dot product is cosine similarity"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(text) for text in encoded])
+
+    os.makedirs(directory, exist_ok=True)
+    # write everything under temp names first so a reader never sees half an index
+    tmp_embeddings = os.path.join(directory, f".tmp-{EMBEDDINGS_FILE}")
+    tmp_nodes = os.path.join(directory, f".tmp-{NODES_FILE}")
+    tmp_texts = os.path.join(directory, f".tmp-{TEXTS_FILE}")
+    with open(tmp_embeddings, "wb") as f:
+        np.save(f, matrix.astype(dtype))
+    with open(tmp_nodes, "wb") as f:
+        np.savez(
+            f,
+            file_names=np.asarray(file_names, dtype=str),
+            file_sizes=np.asarray(file_sizes, dtype=np.int64),
+            text_offsets=text_offsets,
+        )
+    with open(tmp_texts, "wb") as f:
+        f.write(b"".join(encoded))
+
+    os.replace(tmp_texts, os.path.join(directory, TEXTS_FILE))
+    os.replace(tmp_nodes, os.path.join(directory, NODES_FILE))
+    os.replace(tmp_embeddings, os.path.join(directory, EMBEDDINGS_FILE))
+
+
+class DocsVectorStore:
+    """Memory-mapped docs embeddings with exact top-k search by matrix product"""
+
+    def __init__(self, embeddings: np.ndarray, nodes: dict, texts):
+        self.embeddings = embeddings
+        self.file_names = nodes["file_names"]
+        self.file_sizes = nodes["file_sizes"]
+        self.text_offsets = nodes["text_offsets"]
+        self._texts = texts
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return all(
+            os.path.isfile(os.path.join(directory, filename))
+            for filename in (EMBEDDINGS_FILE, NODES_FILE, TEXTS_FILE)
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["DocsVectorStore"]:
+        """Open the store in directory, or None if it was never written"""
+        if not cls.exists(directory):
+            return None
+
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        with np.load(os.path.join(directory, NODES_FILE)) as nodes:
+            nodes = {name: nodes[name] for name in nodes.files}
+        texts_path = os.path.join(directory, TEXTS_FILE)
+        texts = np.memmap(texts_path, dtype=np.uint8, mode="r") if os.path.getsize(texts_path) else b""
+        return cls(embeddings, nodes, texts)
+
+    def __len__(self) -> int:
+        return len(self.file_names)
+
+    def search(self, query_embeddings, top_k: int) -> list[list[tuple[int, float]]]:
+        """(row, score) pairs of the top_k most similar nodes for each query, best first"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if not len(self):
+            return [[] for _ in queries]
+
+        scores = queries @ self.embeddings.T.astype(np.float32)
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, rows in zip(scores, top):
+            rows = rows[np.argsort(-query_scores[rows])]
+            results.append([(int(row), float(query_scores[row])) for row in rows])
+        return results
+
+    def get_node(self, row: int) -> dict:
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        return {
+            "file_name": str(self.file_names[row]),
+            "file_size": int(self.file_sizes[row]),
+            "text": bytes(self._texts[start:end]).decode("utf-8"),
+        }
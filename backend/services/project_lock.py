@@ -0,0 +1,141 @@
+"""
+Per-project job lock in Redis, so jobs that push to the same repo run one after another
+"""
+import threading
+import time
+from typing import Optional
+
+from backend import config
+from backend.exceptions import ProjectLockLostError, ProjectLockTimeoutError
+from backend.integrations.kv import get_redis_client, is_kv_configured
+
+# KEYS: lock, wait queue. ARGV: ticket, lease ms, waiter key prefix, waiter ttl ms.
+# Queues the ticket and takes the lock only once every earlier ticket that is still waiting has had it.
+ACQUIRE_SCRIPT = """
+redis.call('SET', ARGV[3] .. ARGV[1], '1', 'PX', ARGV[4])
+redis.call('ZADD', KEYS[2], 'NX', ARGV[1], ARGV[1])
+while true do
+    local head = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+    if head == ARGV[1] then
+        break
+    end
+    if redis.call('EXISTS', ARGV[3] .. head) == 1 then
+        return 0
+    end
+    -- the waiter stopped polling, drop it from the queue
+    redis.call('ZREM', KEYS[2], head)
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('DEL', ARGV[3] .. ARGV[1])
+    return 1
+end
+return 0
+"""
+
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ProjectLock:
+    """Lease on a project, granted to waiting jobs in the order they asked for it.
+
+    Each grant comes with a fencing token that is larger than every earlier one. The lease
+    is renewed in the background while held; check() raises if it lapsed, so a stalled job
+    never pushes over the work of the job that took the project over.
+    Fails open: without Redis, jobs are not serialized.
+    """
+
+    def __init__(self, project_id: str, job_id: Optional[str] = None):
+        self.project_id = project_id
+        self.job_id = job_id
+        self.key = f"project-lock:{project_id}"
+        self.token: Optional[int] = None
+        self._stop_renewing = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+        self._lost = False
+
+    def acquire(self, timeout: float = config.PROJECT_LOCK["WAIT_TIMEOUT"]) -> "ProjectLock":
+        if not is_kv_configured():
+            return self
+
+        lease_ms = config.PROJECT_LOCK["LEASE"] * 1000
+        poll_interval = config.PROJECT_LOCK["POLL_INTERVAL"]
+        # a waiter that misses a few polls is considered gone
+        waiter_ttl_ms = int(poll_interval * 5 * 1000)
+        deadline = time.time() + timeout
+        try:
+            redis = get_redis_client()
+            # tickets come from the same counter as the fencing tokens, so they are granted in order
+            ticket = redis.incr(f"{self.key}:fence")
+            while not redis.eval(
+                ACQUIRE_SCRIPT, 2, self.key, f"{self.key}:queue",
+                ticket, lease_ms, f"{self.key}:waiter:", waiter_ttl_ms,
+            ):
+                if time.time() >= deadline:
+                    self._leave_queue(ticket)
+                    raise ProjectLockTimeoutError(self.job_id, self.project_id, timeout)
+                time.sleep(poll_interval)
+        except ProjectLockTimeoutError:
+            raise
+        except Exception as e:
+            print(f"[project_lock] failed to lock {self.project_id}, running unserialized: {e}")
+            return self
+
+        self.token = ticket
+        self._renewer = threading.Thread(target=self._renew, args=(ticket, lease_ms), daemon=True)
+        self._renewer.start()
+        print(f"[project_lock] locked {self.project_id} with token {ticket}")
+        return self
+
+    def check(self):
+        """Raise ProjectLockLostError unless this job still holds the project"""
+        if self.token is None:
+            return
+        if not self._lost:
+            try:
+                self._lost = get_redis_client().get(self.key) != str(self.token)
+            except Exception as e:
+                print(f"[project_lock] failed to check lock on {self.project_id}: {e}")
+        if self._lost:
+            raise ProjectLockLostError(self.job_id, self.project_id, self.token)
+
+    def release(self):
+        if self.token is None:
+            return
+        self._stop_renewing.set()
+        try:
+            get_redis_client().eval(RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception as e:
+            print(f"[project_lock] failed to release {self.project_id}, it expires with the lease: {e}")
+        self.token = None
+
+    def _renew(self, token: int, lease_ms: int):
+        while not self._stop_renewing.wait(lease_ms / 1000 / 3):
+            try:
+                if not get_redis_client().eval(RENEW_SCRIPT, 1, self.key, token, lease_ms):
+                    print(f"[project_lock] lease on {self.project_id} lapsed")
+                    self._lost = True
+                    return
+            except Exception as e:
+                print(f"[project_lock] failed to renew lock on {self.project_id}: {e}")
+
+    def _leave_queue(self, ticket: int):
+        try:
+            redis = get_redis_client()
+            redis.zrem(f"{self.key}:queue", ticket)
+            redis.delete(f"{self.key}:waiter:{ticket}")
+        except Exception as e:
+            # the waiter key expires and the next job drops the ticket from the queue
+            print(f"[project_lock] failed to leave queue of {self.project_id}: {e}")
@@ -1,5 +1,5 @@
 from typing import Tuple
-from backend.integrations.llm import get_deepseek_client
+from backend.integrations.llm import get_deepseek_client, cached_chat_completion
 from openai import OpenAI
 from typing import Optional
 import json
@@ -40,7 +40,9 @@ EXAMPLE FORMAT:
             Tuple (is_buildable: bool, reason: str)
         """
         try:
-            response = self.llm_client.chat.completions.create(
+            content = cached_chat_completion(
+                self.llm_client,
+                semantic=True,
                 model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": self.SYSTEM_PROMPT},
@@ -52,7 +54,7 @@ EXAMPLE FORMAT:
                 top_p=0.3  # Added for more deterministic output
             )
 
-            result = self._parse_response(response.choices[0].message.content)
+            result = self._parse_response(content)
             return result
 
         except Exception as e:
@@ -0,0 +1,193 @@
+"""
+Warm per-project git working copies kept on the GITHUB_REPOS volume
+"""
+import fcntl
+import os
+import shutil
+import tempfile
+import time
+
+import git
+
+from backend import config
+from backend.integrations.github_api import (
+    clone_repo_url_to_dir,
+    get_authenticated_repo_url,
+)
+
+
+class RepoCache:
+    """Reuses a cached working copy per project: fetch + hard reset instead of a full clone.
+
+    A working copy is locked for as long as a CodeService uses it. If the lock is busy, flock
+    is not supported or the cache volume is not mounted, checkout falls back to a fresh clone
+    in a temp dir. flock only guards against other jobs in the same container, a Modal Volume
+    does not propagate it; jobs in different containers are kept apart by the project lock.
+    """
+
+    def __init__(self, project_id: str, root_dir: str = config.PATHS["GITHUB_REPOS"]):
+        self.project_id = project_id
+        self.root_dir = root_dir
+        self.repo_dir = os.path.join(root_dir, project_id)
+        self.lock_path = os.path.join(root_dir, f"{project_id}.lock")
+        self.size_path = os.path.join(root_dir, f"{project_id}.size")
+        self._lock_file = None
+
+    def checkout(self, repo_url: str) -> str:
+        """Return the path of a clean working copy of origin/main"""
+        if not config.REPO_CACHE["ENABLED"] or not os.path.isdir(self.root_dir):
+            return self._clone_to_temp_dir(repo_url)
+
+        if not self._acquire_lock(config.REPO_CACHE["LOCK_TIMEOUT"]):
+            print(f"[repo_cache] working copy for {self.project_id} is busy, cloning fresh")
+            return self._clone_to_temp_dir(repo_url)
+
+        try:
+            self._refresh(repo_url)
+        except git.GitCommandError as e:
+            print(f"[repo_cache] cached copy for {self.project_id} unusable, recloning: {e}")
+            try:
+                self._reclone(repo_url)
+            except Exception:
+                self.release()
+                raise
+        except Exception:
+            self.release()
+            raise
+
+        self._evict_least_recently_used()
+        return self.repo_dir
+
+    def release(self):
+        """Unlock the working copy so the next job on this project can reuse it"""
+        if not self._lock_file:
+            return
+        try:
+            # measured here rather than at checkout so eviction never has to walk the volume
+            _write_size(self.size_path, _dir_size(self.repo_dir))
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        finally:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _refresh(self, repo_url: str):
+        if not os.path.isdir(os.path.join(self.repo_dir, ".git")):
+            self._reclone(repo_url)
+            return
+
+        print(f"[repo_cache] refreshing cached working copy for {self.project_id}")
+        repo = git.Repo(self.repo_dir)
+        # token may have rotated since the copy was cloned
+        repo.remote("origin").set_url(get_authenticated_repo_url(repo_url))
+        repo.git.fetch("origin", "main", "--prune")
+        repo.git.checkout("-f", "-B", "main", "--track", "origin/main")
+        repo.git.reset("--hard", "origin/main")
+        repo.git.clean("-fdx")
+
+    def _reclone(self, repo_url: str):
+        print(f"[repo_cache] cloning {self.project_id} into cache")
+        shutil.rmtree(self.repo_dir, ignore_errors=True)
+        clone_repo_url_to_dir(repo_url, self.repo_dir)
+
+    def _clone_to_temp_dir(self, repo_url: str) -> str:
+        repo_dir = tempfile.mkdtemp()
+        clone_repo_url_to_dir(repo_url, repo_dir)
+        return repo_dir
+
+    def _acquire_lock(self, timeout: float) -> bool:
+        lock_file = open(self.lock_path, "a")
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.time() >= deadline:
+                    lock_file.close()
+                    return False
+                time.sleep(1)
+            except OSError as e:
+                # e.g. ENOLCK on a volume without flock support
+                print(f"[repo_cache] cannot lock {self.lock_path}: {e}")
+                lock_file.close()
+                return False
+
+        # the lock file mtime doubles as the last-used timestamp for eviction
+        os.utime(self.lock_path)
+        self._lock_file = lock_file
+        return True
+
+    def _evict_least_recently_used(self):
+        """Delete the oldest unlocked working copies until the cache fits its disk budget.
+
+        Sizes come from the .size files written on release, a copy that was never released counts as empty.
+        """
+        budget = config.REPO_CACHE["MAX_DISK_BYTES"]
+        cached = []
+        total_size = 0
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if not os.path.isdir(path):
+                continue
+            size = _read_size(os.path.join(self.root_dir, f"{name}.size"))
+            total_size += size
+            if name != self.project_id:
+                cached.append((_last_used(self.root_dir, name), name, size))
+
+        for _, name, size in sorted(cached):
+            if total_size <= budget:
+                break
+            if _remove_if_unlocked(self.root_dir, name):
+                print(f"[repo_cache] evicted {name} ({size} bytes)")
+                total_size -= size
+
+
+def _last_used(root_dir: str, project_id: str) -> float:
+    lock_path = os.path.join(root_dir, f"{project_id}.lock")
+    path = lock_path if os.path.exists(lock_path) else os.path.join(root_dir, project_id)
+    return os.path.getmtime(path)
+
+
+def _remove_if_unlocked(root_dir: str, project_id: str) -> bool:
+    with open(os.path.join(root_dir, f"{project_id}.lock"), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        shutil.rmtree(os.path.join(root_dir, project_id), ignore_errors=True)
+        _remove_file(os.path.join(root_dir, f"{project_id}.size"))
+        return True
+
+
+def _read_size(size_path: str) -> int:
+    try:
+        with open(size_path) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_size(size_path: str, size: int):
+    try:
+        with open(size_path, "w") as f:
+            f.write(str(size))
+    except OSError as e:
+        print(f"[repo_cache] failed to record size in {size_path}: {e}")
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _dir_size(path: str) -> int:
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                continue
+    return size
@@ -0,0 +1,166 @@
+"""
+Pool of warm build sandboxes, keyed by the dependency image they were started from
+"""
+import atexit
+import threading
+import time
+from typing import Optional
+
+import modal
+
+from backend import config
+from backend.modal import sandbox_volumes, SANDBOX_ENV_VARS
+
+# Build output of the sandbox's previous user, never synced so it has to be wiped on lease
+BUILD_OUTPUT_DIRS = [".next", "out", ".turbo", "node_modules/.cache"]
+
+
+class SandboxPool:
+    """Keeps up to SIZE idle sandboxes per dependency hash so a build check skips the cold start.
+
+    Sandboxes are shared across projects with the same dependencies. Build output is wiped
+    when a sandbox is leased again, callers sync their working tree into it before use.
+    Sandboxes older than TTL are recycled.
+    """
+
+    def __init__(
+        self,
+        size: int = config.SANDBOX_POOL["SIZE"],
+        ttl: int = config.SANDBOX_POOL["TTL"],
+    ):
+        self.size = size
+        self.ttl = ttl
+        self._idle: dict[str, list[modal.Sandbox]] = {}
+        self._info: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "leases": 0,
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "returned": 0,
+            "recycled": 0,
+            "prewarm_failures": 0,
+        }
+
+        atexit.register(self.shutdown)
+
+    def lease(self, deps_hash: str, image: modal.Image) -> modal.Sandbox:
+        """Take a warm sandbox for this dependency image, or start a new one"""
+        sandbox = self._pop_idle(deps_hash)
+        self._count("leases")
+        if sandbox:
+            self._count("hits")
+            print(f"[sandbox_pool] reusing warm sandbox {sandbox.object_id}")
+        else:
+            self._count("misses")
+            sandbox = self._create(deps_hash, image)
+
+        if config.SANDBOX_POOL["PREWARM"]:
+            threading.Thread(
+                target=self._prewarm, args=(deps_hash, image), daemon=True
+            ).start()
+        return sandbox
+
+    def release(self, sandbox: modal.Sandbox, reusable: bool = True):
+        """Return a sandbox to the pool, terminating it if it can't or shouldn't be reused"""
+        info = self._info.get(sandbox.object_id)
+        if reusable and info and self.is_usable(sandbox):
+            with self._lock:
+                idle = self._idle.setdefault(info["deps_hash"], [])
+                if len(idle) < self.size:
+                    idle.append(sandbox)
+                    self._metrics["returned"] += 1
+                    return
+        self._terminate(sandbox)
+
+    def is_usable(self, sandbox: modal.Sandbox) -> bool:
+        """Whether the sandbox is still running and younger than the pool TTL"""
+        info = self._info.get(sandbox.object_id)
+        if not info or time.time() - info["created_at"] > self.ttl:
+            return False
+        try:
+            return sandbox.poll() is None
+        except Exception:
+            return False
+
+    def metrics(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["idle"] = {deps_hash[:12]: len(idle) for deps_hash, idle in self._idle.items()}
+        metrics["hit_rate"] = metrics["hits"] / metrics["leases"] if metrics["leases"] else 0.0
+        return metrics
+
+    def shutdown(self):
+        """Terminate all idle sandboxes, e.g. when the container exits"""
+        with self._lock:
+            idle = [sandbox for sandboxes in self._idle.values() for sandbox in sandboxes]
+            self._idle = {}
+        for sandbox in idle:
+            self._terminate(sandbox)
+
+    def _pop_idle(self, deps_hash: str) -> Optional[modal.Sandbox]:
+        while True:
+            with self._lock:
+                idle = self._idle.get(deps_hash)
+                if not idle:
+                    return None
+                sandbox = idle.pop()
+            if self.is_usable(sandbox) and self._clear_build_output(sandbox):
+                return sandbox
+            self._count("recycled")
+            self._terminate(sandbox)
+
+    def _clear_build_output(self, sandbox: modal.Sandbox) -> bool:
+        try:
+            return sandbox.exec("rm", "-rf", *BUILD_OUTPUT_DIRS, workdir="/repo").wait() == 0
+        except Exception as e:
+            print(f"[sandbox_pool] failed to clear build output in {sandbox.object_id}: {e}")
+            return False
+
+    def _prewarm(self, deps_hash: str, image: modal.Image):
+        with self._lock:
+            missing = self.size - len(self._idle.get(deps_hash, []))
+        for _ in range(missing):
+            try:
+                self.release(self._create(deps_hash, image))
+            except Exception as e:
+                self._count("prewarm_failures")
+                print(f"[sandbox_pool] failed to prewarm sandbox: {e}")
+                return
+
+    def _create(self, deps_hash: str, image: modal.Image) -> modal.Sandbox:
+        app = modal.App.lookup(config.APP_NAME)
+        sandbox = modal.Sandbox.create(
+            app=app,
+            image=image,
+            cpu=config.SANDBOX_POOL["CPU"],
+            memory=config.SANDBOX_POOL["MEMORY"],
+            workdir="/repo",
+            volumes=sandbox_volumes,
+            env=SANDBOX_ENV_VARS,
+            # hard upper bound so leaked or forgotten sandboxes never outlive a lease for long
+            timeout=self.ttl * 2,
+            idle_timeout=config.SANDBOX_POOL["IDLE_TIMEOUT"],
+        )
+        with self._lock:
+            self._info[sandbox.object_id] = {"deps_hash": deps_hash, "created_at": time.time()}
+            self._metrics["created"] += 1
+        print(f"[sandbox_pool] created sandbox {sandbox.object_id} for {deps_hash[:12]}")
+        return sandbox
+
+    def _terminate(self, sandbox: modal.Sandbox):
+        with self._lock:
+            self._info.pop(sandbox.object_id, None)
+        try:
+            sandbox.terminate()
+        except Exception as e:
+            print(f"[sandbox_pool] failed to terminate sandbox {sandbox.object_id}: {e}")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._metrics[name] += 1
+
+
+# one pool per container, shared by every CodeService in it
+sandbox_pool = SandboxPool()
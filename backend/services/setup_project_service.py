@@ -1,4 +1,9 @@
 import re
+import threading
+import time
+from typing import Optional
+
+import modal
 
 from backend.services.code_service import CodeService
 from backend.services.context_enhancer import CodeContextEnhancer
@@ -15,29 +20,58 @@ from backend.integrations.vercel_api import VercelApi
 from backend.integrations.db import Database
 from backend.integrations.llm import (
     generate_project_name,
-    send_prompt_to_reasoning_model,
+    stream_prompt_to_reasoning_model,
 )
+from backend.utils.dag import StageGraph
 from backend.utils.strings import sanitize_project_name
+from backend import config
 from backend.config import SETUP_COMPLETE_COMMIT_MESSAGE
 
+# seconds between progress logs while a brainstorm doc is being generated
+DOC_PROGRESS_LOG_INTERVAL = 20
+
 
 class SetupProjectService:
-    def __init__(self, project_id: str, job_id: str, data: dict):
+    def __init__(self, project_id: str, job_id: str, data: dict, reply_to_cast: Optional[dict] = None):
         self.project_id = project_id
         self.job_id = job_id
         self.data = data
         self.user_context: UserContext = data["user_context"]
         self.db = Database()
+        # {"hash", "fid"} of the cast that requested this project, answered once the repo exists
+        self.reply_to_cast = reply_to_cast
+        # set once a setup stage failed, long running stages stop at their next check
+        self.cancelled = threading.Event()
+        self.failed = False
 
     def run(self):
         """Fast initial setup without final verification"""
+        self.code_service: Optional[CodeService] = None
         try:
             self._log("Starting core setup")
             self._validate_data()
-            self._generate_project_name()
-            self._setup_github_repo()
-            self._setup_vercel_project()
-            self._apply_initial_customization()
+
+            # brainstorming only needs the prompt, so it overlaps with repo, Vercel and sandbox setup
+            stages = StageGraph(on_error=lambda name, error: self._fail_setup(f"{name} failed: {error}"))
+            self.cancelled = stages.cancelled
+            stages.add("project_name", self._generate_project_name)
+            stages.add("brainstorm_docs", self._generate_brainstorm_docs)
+            stages.add("github_repo", self._setup_github_repo, depends_on=["project_name"])
+            stages.add("repo_created", self._on_repo_created, depends_on=["github_repo"])
+            stages.add("vercel_project", self._setup_vercel_project, depends_on=["github_repo"])
+            stages.add("code_service", self._prepare_code_service, depends_on=["github_repo"])
+            stages.add(
+                "brainstorm_commit",
+                self._add_brainstorm_docs_to_repo,
+                depends_on=["code_service", "brainstorm_docs"],
+            )
+            stages.add(
+                "initial_customization",
+                self._apply_initial_customization,
+                depends_on=["brainstorm_commit", "vercel_project"],
+            )
+            stages.run()
+
             self.db.update_project(
                 self.project_id,
                 {
@@ -48,24 +82,35 @@ class SetupProjectService:
             self._log("finished the project setup")
         except Exception as e:
             print(f"Failed to complete core setup. Error: {e}")
-            self.db.update_project(
-                self.project_id,
-                {
-                    "status": "failed",
-                },
-            )
-            self.db.update_job_status(self.job_id, "failed")
-            self._log("core setup failed")
+            self._fail_setup(str(e))
+        finally:
+            if self.code_service:
+                self.code_service.close()
+            self.db.flush_logs()
 
-    def _apply_initial_customization(self):
-        """Only apply user's initial prompt customization"""
-        prompt = self.data["prompt"]
-        self._log("Generating a concept of a plan")
+    def _fail_setup(self, error: str):
+        """Mark the project and job failed once, on the first error without waiting for running stages"""
+        if self.failed:
+            return
+        self.failed = True
+        self.db.update_project(
+            self.project_id,
+            {
+                "status": "failed",
+            },
+        )
+        self.db.update_job_status(self.job_id, "failed", error)
+        self._log("core setup failed")
+        # still answer the cast, it links to the frontend where the failure shows
+        self._on_repo_created()
 
-        code_service = CodeService(self.project_id, self.job_id, self.user_context, manual_sandbox_termination=True)
-        code_service._create_sandbox(repo_dir=code_service.repo_dir)
+    def _prepare_code_service(self):
+        self.code_service = CodeService(self.project_id, self.job_id, self.user_context, manual_sandbox_termination=True)
+        self.code_service._create_sandbox(repo_dir=self.code_service.repo_dir)
 
-        self._add_brainstorm_docs_to_repo(code_service, prompt)
+    def _apply_initial_customization(self):
+        """Only apply user's initial prompt customization"""
+        code_service = self.code_service
 
         self._log("Starting initial code implementation")
         MAX_ITERATAIONS = 20
@@ -95,8 +140,6 @@ class SetupProjectService:
         except Exception as e:
             print(f'initial code writing failed: {e}')
             self._log(f"initial code writing failed: {str(e)}", "error")
-        finally:
-            code_service.terminate_sandbox()
 
     def _generate_project_name(self):
         project_name = generate_project_name(self.data["prompt"])
@@ -104,33 +147,72 @@ class SetupProjectService:
         self._log(message=f"Generated project name: {self.project_name}")
         self.db.update_project(self.project_id, dict(name=project_name))
 
-    def _add_brainstorm_docs_to_repo(self, code_service: CodeService, prompt: str):
+    def _generate_brainstorm_docs(self):
+        """Spec, plan and todo list for the prompt, each generated from the previous one"""
+        prompt = self.data["prompt"]
+        self._log("Generating a concept of a plan")
+        self.brainstorm_docs = {}
+
+        context = CodeContextEnhancer().get_relevant_context(prompt)
+        print("got context, now sending prompt to reasoning model")
+        create_spec = CREATE_SPEC_PROMPT.format(context=context, prompt=prompt)
+        spec_content = self._generate_doc("spec.md", create_spec)
+        if spec_content is None:
+            return
+
+        create_prompt_plan = CREATE_PROMPT_PLAN_PROMPT.format(spec=spec_content)
+        prompt_plan_content = self._generate_doc("prompt_plan.md", create_prompt_plan)
+        if prompt_plan_content is None:
+            return
+
+        todo = CREATE_TODO_LIST_PROMPT.format(plan=prompt_plan_content)
+        self._generate_doc("todo.md", todo)
+
+    def _add_brainstorm_docs_to_repo(self):
         print("Adding brainstormed docs to repo")
-        try:
-            context = CodeContextEnhancer().get_relevant_context(prompt)
-            print("got context, now sending prompt to reasoning model")
-            create_spec = CREATE_SPEC_PROMPT.format(context=context, prompt=prompt)
-            spec_content, spec_reasoning = send_prompt_to_reasoning_model(create_spec)
-            print(f"Received spec content: {spec_content}\nReasoning: {spec_reasoning}")
-            code_service._add_file_to_repo_dir("spec.md", spec_content)
-
-            create_prompt_plan = CREATE_PROMPT_PLAN_PROMPT.format(spec=spec_content)
-            prompt_plan_content, plan_reasoning = send_prompt_to_reasoning_model(create_prompt_plan)
-            print(f"Received plan content: {prompt_plan_content}\nReasoning: {plan_reasoning}")
-            code_service._add_file_to_repo_dir("prompt_plan.md", prompt_plan_content)
-
-            todo = CREATE_TODO_LIST_PROMPT.format(plan=prompt_plan_content)
-            todo_content, todo_reasoning = send_prompt_to_reasoning_model(todo)
-            print(f"Received todo content: {todo_content}\nReasoning: {todo_reasoning}")
-            code_service._add_file_to_repo_dir("todo.md", content=todo_content)
-
-            code_service._create_commit("Add spec, plan, and todo list")
-            code_service._sync_git_changes()
-        except Exception as e:
-            print(f"Error occurred while creating todo list: {e}")
-            code_service._create_commit("Add spec, plan, and todo list")
-            code_service._sync_git_changes()
-            raise e
+        code_service = self.code_service
+        for filename, content in self.brainstorm_docs.items():
+            code_service._add_file_to_repo_dir(filename, content)
+
+        code_service._create_commit("Add spec, plan, and todo list")
+        code_service._sync_git_changes()
+
+    def _generate_doc(self, filename: str, prompt: str) -> Optional[str]:
+        """Stream a reasoning model answer for filename, logging progress while it is generated.
+
+        None if the setup failed elsewhere before the doc was started.
+        """
+        if self.cancelled.is_set():
+            self._log(f"Setup failed, skipping {filename}")
+            return None
+        progress = {"reasoning": 0, "answer": 0, "logged_at": time.time()}
+
+        def on_progress(section: str, text: str):
+            if self.cancelled.is_set():
+                # ends the stream, the setup has failed already
+                raise Exception(f"Setup failed, stopped generating {filename}")
+            if not progress["reasoning"] and not progress["answer"]:
+                self._log(f"Planning {filename}")
+            if section == "answer" and not progress["answer"]:
+                self._log(f"Writing {filename}")
+            progress[section] += len(text)
+            if time.time() - progress["logged_at"] >= DOC_PROGRESS_LOG_INTERVAL:
+                progress["logged_at"] = time.time()
+                self._log(f"{filename}: {progress['reasoning']} reasoning and {progress['answer']} answer characters so far")
+
+        content, reasoning, stats = stream_prompt_to_reasoning_model(
+            prompt,
+            on_reasoning=lambda text: on_progress("reasoning", text),
+            on_answer=lambda text: on_progress("answer", text),
+        )
+        print(f"Received {filename} content: {content}\nReasoning: {reasoning}")
+        if not stats["cached"]:
+            self._log(
+                f"{filename} generated: first token after {stats['time_to_first_token']:.1f}s, "
+                f"{stats['tokens_per_second']:.1f} tokens/s"
+            )
+        self.brainstorm_docs[filename] = content
+        return content
 
     def _setup_github_repo(self):
         self._log("Creating GitHub repository")
@@ -144,6 +226,22 @@ class SetupProjectService:
             self.project_id, dict(repo_url=f"github.com/{self.repo_name}")
         )
 
+    def _on_repo_created(self):
+        """Reply to the requesting cast, once per setup"""
+        if not self.reply_to_cast:
+            return
+
+        reply_to_cast, self.reply_to_cast = self.reply_to_cast, None
+        try:
+            reply = modal.Function.from_name(config.APP_NAME, config.MODAL_REPLY_TO_CAST_FUNCTION_NAME)
+            reply.spawn(
+                project_id=self.project_id,
+                cast_hash=reply_to_cast["hash"],
+                fid=reply_to_cast["fid"],
+            )
+        except Exception as e:
+            self._log(f"Failed to reply to cast {reply_to_cast['hash']}: {str(e)}", "warning")
+
     def _setup_vercel_project(self):
         self._log(message="Creating Vercel project")
         if not self.repo_name:
@@ -0,0 +1,142 @@
+import os
+import threading
+import pytest
+from unittest.mock import Mock, patch
+
+from backend.services import context_enhancer
+from backend.services.context_enhancer import CodeContextEnhancer, get_retriever, reciprocal_rank_fusion
+from backend.services.docs_vector_store import write_vector_store
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    (tmp_path / "docstore.json").write_text("{}")
+    monkeypatch.setattr(context_enhancer, "INDEX_STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(context_enhancer, "_index_cache", {})
+    return tmp_path
+
+
+@pytest.fixture
+def load_index():
+    with patch.object(context_enhancer, "_load_index") as load_index:
+        load_index.side_effect = lambda: Mock()
+        yield load_index
+
+
+class TestSharedIndex:
+    def test_loaded_once_across_enhancers(self, index_dir, load_index):
+        first = CodeContextEnhancer().retriever
+        second = CodeContextEnhancer().retriever
+
+        assert first is second
+        assert load_index.call_count == 1
+
+    def test_reloaded_when_index_files_change(self, index_dir, load_index):
+        before = get_retriever()
+
+        docstore = index_dir / "docstore.json"
+        docstore.write_text('{"docstore/data": {}}')
+        os.utime(docstore, ns=(0, 0))
+
+        assert get_retriever() is not before
+        assert load_index.call_count == 2
+
+    def test_concurrent_first_use_loads_once(self, index_dir, load_index):
+        engines = []
+        threads = [
+            threading.Thread(target=lambda: engines.append(get_retriever()))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert load_index.call_count == 1
+        assert all(engine is engines[0] for engine in engines)
+
+    def test_reset_during_use_reloads_instead_of_failing(self, index_dir, load_index):
+        errors = []
+
+        def use():
+            try:
+                for _ in range(200):
+                    get_retriever()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=use) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in range(200):
+            context_enhancer._reset_cache()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+
+
+class TestCompactVectorStore:
+    def test_context_comes_from_vector_store_without_llama_index(self, index_dir, load_index):
+        write_vector_store(
+            str(index_dir),
+            embeddings=[[1.0, 0.0], [0.0, 1.0]],
+            file_names=["frames.md", "neynar.md"],
+            file_sizes=[1, 2],
+            texts=["How to build frames", "Neynar API reference"],
+        )
+
+        with patch.object(context_enhancer, "generate_search_queries_from_user_input", return_value=["frames"]), \
+                patch.object(context_enhancer, "embed_model") as embed_model:
+            embed_model.get_text_embedding_batch.return_value = [[1.0, 0.1]]
+            context = CodeContextEnhancer().get_relevant_context("make me a frame")
+
+        assert context == "How to build frames"
+        load_index.assert_not_called()
+
+
+class TestRetrieverFallback:
+    def test_uses_scored_nodes_without_llm_synthesis(self, index_dir):
+        node = Mock(score=0.8, text="How to build frames", metadata={"file_name": "frames.md", "file_size": 1})
+        index = Mock()
+        index.as_retriever.return_value.retrieve.return_value = [node]
+
+        with patch.object(context_enhancer, "_load_index", return_value=index), \
+                patch.object(context_enhancer, "generate_search_queries_from_user_input", return_value=["frames"]), \
+                patch.object(context_enhancer, "embed_model") as embed_model:
+            embed_model.get_text_embedding_batch.return_value = [[1.0, 0.0]]
+            context = CodeContextEnhancer().get_relevant_context("make me a frame")
+
+        assert context == "How to build frames"
+        index.as_retriever.assert_called_once_with(similarity_top_k=context_enhancer.CODE_CONTEXT["TOP_K"])
+        index.as_query_engine.assert_not_called()
+
+
+class TestMultiQueryRetrieval:
+    def test_queries_embedded_in_one_batch(self, index_dir, load_index):
+        write_vector_store(
+            str(index_dir),
+            embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]],
+            file_names=["frames.md", "neynar.md", "degen.md"],
+            file_sizes=[1, 2, 3],
+            texts=["frames", "neynar", "degen"],
+        )
+        queries = ["frames", "neynar", "unrelated"]
+
+        with patch.object(context_enhancer, "generate_search_queries_from_user_input", return_value=queries), \
+                patch.object(context_enhancer, "embed_model") as embed_model:
+            embed_model.get_text_embedding_batch.return_value = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [-1.0, -1.0, 0.0]]
+            context = CodeContextEnhancer().get_relevant_context("frame with neynar data")
+
+        embed_model.get_text_embedding_batch.assert_called_once_with(queries)
+        assert context == "frames\n\nneynar"
+
+    def test_reciprocal_rank_fusion_favours_nodes_found_by_several_queries(self):
+        a = {"file_name": "a.md", "text": "a", "score": 0.9}
+        b = {"file_name": "b.md", "text": "b", "score": 0.6}
+        c = {"file_name": "c.md", "text": "c", "score": 0.7}
+
+        fused = reciprocal_rank_fusion([[a, b], [c, b], [b]])
+
+        assert [node["file_name"] for node in fused] == ["b.md", "a.md", "c.md"]
+        assert fused[0]["score"] == 0.6
@@ -0,0 +1,84 @@
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from backend.services import dependency_image_cache
+from backend.services.dependency_image_cache import (
+    DependencyImageCache, get_dependency_hash, get_dependency_manifest_paths, is_dependency_manifest,
+)
+
+
+class TestDependencyHash:
+    def _write(self, directory, filename, content):
+        (directory / filename).write_text(content)
+
+    def test_same_manifests_give_same_hash_across_repos(self, tmp_path):
+        for name in ["a", "b"]:
+            repo = tmp_path / name
+            repo.mkdir()
+            self._write(repo, "package.json", '{"dependencies": {"next": "15.0.0"}}')
+            self._write(repo, "pnpm-lock.yaml", "lockfileVersion: '9.0'")
+            self._write(repo, "Frame.tsx", f"export const name = '{name}'")
+
+        assert get_dependency_hash(str(tmp_path / "a")) == get_dependency_hash(str(tmp_path / "b"))
+
+    def test_lockfile_change_changes_hash(self, tmp_path):
+        self._write(tmp_path, "package.json", "{}")
+        self._write(tmp_path, "pnpm-lock.yaml", "lockfileVersion: '9.0'")
+        before = get_dependency_hash(str(tmp_path))
+
+        self._write(tmp_path, "pnpm-lock.yaml", "lockfileVersion: '9.0'\npackages: {}")
+
+        assert get_dependency_hash(str(tmp_path)) != before
+
+
+    def test_workspace_and_patches_are_install_inputs(self, tmp_path):
+        self._write(tmp_path, "package.json", "{}")
+        self._write(tmp_path, "pnpm-workspace.yaml", "packages: []")
+        (tmp_path / "patches").mkdir()
+        self._write(tmp_path / "patches", "next@15.0.0.patch", "diff")
+        before = get_dependency_hash(str(tmp_path))
+
+        self._write(tmp_path / "patches", "next@15.0.0.patch", "diff --git")
+
+        assert get_dependency_manifest_paths(str(tmp_path)) == [
+            "package.json", "pnpm-workspace.yaml", "patches/next@15.0.0.patch",
+        ]
+        assert get_dependency_hash(str(tmp_path)) != before
+
+    def test_is_dependency_manifest(self):
+        assert is_dependency_manifest("./pnpm-lock.yaml")
+        assert is_dependency_manifest("patches/next@15.0.0.patch")
+        assert not is_dependency_manifest("./src/package.json")
+        assert not is_dependency_manifest("./patches-notes.md")
+
+class TestDependencyImageCache:
+    @pytest.fixture
+    def index(self):
+        index = {}
+        mock_dict = Mock()
+        mock_dict.get.side_effect = index.get
+        mock_dict.put.side_effect = index.__setitem__
+        mock_dict.pop.side_effect = index.pop
+        with patch.object(dependency_image_cache.modal.Dict, "from_name", return_value=mock_dict):
+            yield index
+
+    def test_put_then_get_returns_cached_image(self, index):
+        cache = DependencyImageCache()
+        cache.put("abc", Mock(object_id="im-123"))
+
+        with patch.object(dependency_image_cache.modal.Image, "from_id") as from_id:
+            image = cache.get("abc")
+
+        from_id.assert_called_once_with("im-123")
+        assert image is from_id.return_value
+
+    def test_expired_entry_is_a_miss(self, index):
+        index["abc"] = {"image_id": "im-123", "created_at": time.time() - 30 * 24 * 3600}
+
+        assert DependencyImageCache().get("abc") is None
+        assert "abc" not in index
+
+    def test_unreachable_index_is_a_miss(self):
+        with patch.object(dependency_image_cache.modal.Dict, "from_name", side_effect=Exception("no modal auth")):
+            assert DependencyImageCache().get("abc") is None
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from backend.services.docs_vector_store import DocsVectorStore, write_vector_store
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    write_vector_store(
+        str(tmp_path),
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [1.0, 1.0, 0.0]],
+        file_names=["frames.md", "neynar.md", "ünïcode.md"],
+        file_sizes=[10, 20, 30],
+        texts=["Frames v2", "Neynar API", "Grüße"],
+    )
+    return tmp_path
+
+
+class TestDocsVectorStore:
+    def test_missing_store_loads_as_none(self, tmp_path):
+        assert DocsVectorStore.load(str(tmp_path)) is None
+
+    def test_round_trip(self, store_dir):
+        store = DocsVectorStore.load(str(store_dir))
+
+        assert len(store) == 3
+        assert store.embeddings.dtype == np.float16
+        assert store.get_node(2) == {"file_name": "ünïcode.md", "file_size": 30, "text": "Grüße"}
+        assert not list(store_dir.glob(".tmp-*"))
+
+    def test_search_returns_best_first_cosine_scores(self, store_dir):
+        store = DocsVectorStore.load(str(store_dir))
+
+        [matches] = store.search([0.0, 5.0, 0.0], top_k=2)
+
+        assert [row for row, _ in matches] == [1, 2]
+        assert matches[0][1] == pytest.approx(1.0, abs=1e-3)
+        assert matches[1][1] == pytest.approx(0.7071, abs=1e-3)
+
+    def test_search_batches_queries(self, store_dir):
+        store = DocsVectorStore.load(str(store_dir))
+
+        results = store.search([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], top_k=5)
+
+        assert [matches[0][0] for matches in results] == [0, 1]
+        assert all(len(matches) == 3 for matches in results)
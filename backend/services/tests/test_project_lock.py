@@ -0,0 +1,70 @@
+import pytest
+from unittest.mock import Mock, patch
+
+from backend import config
+from backend.exceptions import ProjectLockLostError, ProjectLockTimeoutError
+from backend.services import project_lock
+from backend.services.project_lock import ProjectLock
+
+
+@pytest.fixture
+def redis():
+    redis = Mock()
+    redis.incr.return_value = 7
+    with patch.object(project_lock, "get_redis_client", return_value=redis), \
+            patch.object(project_lock, "is_kv_configured", return_value=True), \
+            patch.dict(config.PROJECT_LOCK, {"POLL_INTERVAL": 0, "LEASE": 60}):
+        yield redis
+
+
+class TestProjectLock:
+    def test_waits_in_queue_until_granted(self, redis):
+        redis.eval.side_effect = [0, 0, 1]
+
+        lock = ProjectLock("project-1", "job-1").acquire()
+
+        assert lock.token == 7
+        assert redis.eval.call_count == 3
+        _, numkeys, *keys_and_args = redis.eval.call_args.args
+        assert keys_and_args[:3] == ["project-lock:project-1", "project-lock:project-1:queue", 7]
+        lock.release()
+
+    def test_timeout_leaves_queue(self, redis):
+        redis.eval.return_value = 0
+
+        with pytest.raises(ProjectLockTimeoutError):
+            ProjectLock("project-1", "job-1").acquire(timeout=0)
+
+        redis.zrem.assert_called_once_with("project-lock:project-1:queue", 7)
+
+    def test_check_raises_once_another_job_holds_the_project(self, redis):
+        redis.eval.return_value = 1
+        lock = ProjectLock("project-1", "job-1").acquire()
+
+        redis.get.return_value = "7"
+        lock.check()
+
+        redis.get.return_value = "8"
+        with pytest.raises(ProjectLockLostError):
+            lock.check()
+        lock.release()
+
+    def test_release_only_deletes_own_lock(self, redis):
+        redis.eval.return_value = 1
+        lock = ProjectLock("project-1", "job-1").acquire()
+
+        lock.release()
+
+        script, numkeys, key, token = redis.eval.call_args.args
+        assert script == project_lock.RELEASE_SCRIPT
+        assert (key, token) == ("project-lock:project-1", 7)
+        assert lock.token is None
+
+    def test_runs_unserialized_when_redis_is_down(self, redis):
+        redis.incr.side_effect = ConnectionError("down")
+
+        lock = ProjectLock("project-1", "job-1").acquire()
+
+        assert lock.token is None
+        lock.check()
+        lock.release()
@@ -0,0 +1,130 @@
+import errno
+import os
+import shutil
+import pytest
+import git
+from unittest.mock import patch
+
+from backend import config
+from backend.integrations.github_api import configure_git_user_for_repo
+from backend.services import repo_cache
+from backend.services.repo_cache import RepoCache
+
+
+def _local_clone(repo_url, dir_path):
+    return git.Repo.clone_from(repo_url, dir_path)
+
+
+class TestRepoCache:
+    @pytest.fixture
+    def origin(self, tmp_path):
+        """A bare 'remote' plus a working clone used to push new commits to it"""
+        bare_dir = tmp_path / "origin.git"
+        git.Repo.init(bare_dir, bare=True, initial_branch="main")
+        pusher = git.Repo.clone_from(str(bare_dir), tmp_path / "pusher")
+        configure_git_user_for_repo(pusher)
+        pusher.git.checkout("-b", "main")
+        self._commit(pusher, "README.md", "v1")
+        pusher.git.push("origin", "main")
+        return str(bare_dir), pusher
+
+    @pytest.fixture
+    def cache_root(self, tmp_path):
+        root = tmp_path / "github-repos"
+        root.mkdir()
+        return str(root)
+
+    @pytest.fixture(autouse=True)
+    def local_git(self):
+        with patch.object(repo_cache, "clone_repo_url_to_dir", side_effect=_local_clone), \
+                patch.object(repo_cache, "get_authenticated_repo_url", side_effect=lambda url: url):
+            yield
+
+    def _commit(self, repo, filename, content):
+        with open(os.path.join(repo.working_dir, filename), "w") as f:
+            f.write(content)
+        repo.git.add(A=True)
+        repo.git.commit("-m", f"update {filename}")
+
+    def test_first_checkout_clones_into_cache(self, origin, cache_root):
+        origin_url, _ = origin
+        cache = RepoCache("project-1", root_dir=cache_root)
+
+        repo_dir = cache.checkout(origin_url)
+
+        assert repo_dir == os.path.join(cache_root, "project-1")
+        assert open(os.path.join(repo_dir, "README.md")).read() == "v1"
+        cache.release()
+
+    def test_second_checkout_fetches_and_discards_local_changes(self, origin, cache_root):
+        origin_url, pusher = origin
+        cache = RepoCache("project-1", root_dir=cache_root)
+        repo_dir = cache.checkout(origin_url)
+        with open(os.path.join(repo_dir, "scratch.txt"), "w") as f:
+            f.write("left over from a failed job")
+        cache.release()
+
+        self._commit(pusher, "README.md", "v2")
+        pusher.git.push("origin", "main")
+
+        repo_dir = RepoCache("project-1", root_dir=cache_root).checkout(origin_url)
+
+        assert open(os.path.join(repo_dir, "README.md")).read() == "v2"
+        assert not os.path.exists(os.path.join(repo_dir, "scratch.txt"))
+        assert git.Repo(repo_dir).active_branch.tracking_branch().name == "origin/main"
+
+    def test_busy_working_copy_falls_back_to_temp_clone(self, origin, cache_root):
+        origin_url, _ = origin
+        holder = RepoCache("project-1", root_dir=cache_root)
+        holder.checkout(origin_url)
+
+        with patch.dict(config.REPO_CACHE, {"LOCK_TIMEOUT": 0}):
+            repo_dir = RepoCache("project-1", root_dir=cache_root).checkout(origin_url)
+
+        assert not repo_dir.startswith(cache_root)
+        assert open(os.path.join(repo_dir, "README.md")).read() == "v1"
+        holder.release()
+        shutil.rmtree(repo_dir)
+
+    def test_eviction_removes_least_recently_used_unlocked_copies(self, origin, cache_root):
+        origin_url, _ = origin
+        for project_id in ["old", "newer"]:
+            cache = RepoCache(project_id, root_dir=cache_root)
+            cache.checkout(origin_url)
+            cache.release()
+        os.utime(os.path.join(cache_root, "old.lock"), (0, 0))
+
+        with patch.dict(config.REPO_CACHE, {"MAX_DISK_BYTES": 1}):
+            cache = RepoCache("current", root_dir=cache_root)
+            cache.checkout(origin_url)
+
+        assert not os.path.exists(os.path.join(cache_root, "old"))
+        assert not os.path.exists(os.path.join(cache_root, "newer"))
+        assert os.path.exists(os.path.join(cache_root, "current"))
+        cache.release()
+
+    def test_volume_without_flock_falls_back_to_temp_clone(self, origin, cache_root):
+        origin_url, _ = origin
+
+        with patch.object(repo_cache.fcntl, "flock", side_effect=OSError(errno.ENOLCK, "No locks available")):
+            repo_dir = RepoCache("project-1", root_dir=cache_root).checkout(origin_url)
+
+        assert not repo_dir.startswith(cache_root)
+        shutil.rmtree(repo_dir)
+
+    def test_release_records_size_for_eviction(self, origin, cache_root):
+        origin_url, _ = origin
+        cache = RepoCache("project-1", root_dir=cache_root)
+        cache.checkout(origin_url)
+
+        cache.release()
+
+        assert int(open(os.path.join(cache_root, "project-1.size")).read()) > 0
+
+    def test_missing_cache_volume_clones_to_temp_dir(self, origin, tmp_path):
+        origin_url, _ = origin
+
+        repo_dir = RepoCache("project-1", root_dir=str(tmp_path / "not-mounted")).checkout(origin_url)
+
+        assert os.path.exists(os.path.join(repo_dir, "README.md"))
+        shutil.rmtree(repo_dir)
@@ -0,0 +1,106 @@
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from backend.services import sandbox_pool as sandbox_pool_module
+from backend.services.sandbox_pool import SandboxPool
+
+
+class TestSandboxPool:
+    @pytest.fixture
+    def create_sandbox(self):
+        created = []
+
+        def create(**kwargs):
+            sandbox = Mock()
+            sandbox.object_id = f"sb-{len(created)}"
+            sandbox.poll.return_value = None
+            sandbox.exec.return_value.wait.return_value = 0
+            created.append(sandbox)
+            return sandbox
+
+        with patch.object(sandbox_pool_module.modal.App, "lookup"), \
+                patch.object(sandbox_pool_module.modal.Sandbox, "create", side_effect=create) as mock_create, \
+                patch.dict(sandbox_pool_module.config.SANDBOX_POOL, {"PREWARM": False}):
+            mock_create.created = created
+            yield mock_create
+
+    def test_released_sandbox_is_reused_for_same_dependency_hash(self, create_sandbox):
+        pool = SandboxPool(size=1, ttl=60)
+        first = pool.lease("hash-a", Mock())
+        pool.release(first)
+
+        second = pool.lease("hash-a", Mock())
+
+        assert second is first
+        assert create_sandbox.call_count == 1
+        assert pool.metrics()["hits"] == 1
+
+    def test_reused_sandbox_has_previous_build_output_wiped(self, create_sandbox):
+        pool = SandboxPool(size=1, ttl=60)
+        first = pool.lease("hash-a", Mock())
+        first.exec.assert_not_called()
+        pool.release(first)
+
+        pool.lease("hash-a", Mock())
+
+        first.exec.assert_called_once_with("rm", "-rf", *sandbox_pool_module.BUILD_OUTPUT_DIRS, workdir="/repo")
+
+    def test_sandbox_that_cannot_be_wiped_is_recycled(self, create_sandbox):
+        pool = SandboxPool(size=1, ttl=60)
+        first = pool.lease("hash-a", Mock())
+        pool.release(first)
+        first.exec.return_value.wait.return_value = 1
+
+        assert pool.lease("hash-a", Mock()) is not first
+        first.terminate.assert_called_once()
+
+    def test_different_dependency_hash_gets_new_sandbox(self, create_sandbox):
+        pool = SandboxPool(size=1, ttl=60)
+        pool.release(pool.lease("hash-a", Mock()))
+
+        pool.lease("hash-b", Mock())
+
+        assert create_sandbox.call_count == 2
+        assert pool.metrics()["misses"] == 2
+
+    def test_release_beyond_pool_size_terminates(self, create_sandbox):
+        pool = SandboxPool(size=1, ttl=60)
+        first, second = pool.lease("hash-a", Mock()), pool.lease("hash-a", Mock())
+
+        pool.release(first)
+        pool.release(second)
+
+        second.terminate.assert_called_once()
+        first.terminate.assert_not_called()
+
+    def test_expired_sandbox_is_recycled(self, create_sandbox):
+        pool = SandboxPool(size=1, ttl=60)
+        first = pool.lease("hash-a", Mock())
+        pool.release(first)
+        pool._info[first.object_id]["created_at"] = time.time() - 120
+
+        second = pool.lease("hash-a", Mock())
+
+        assert second is not first
+        first.terminate.assert_called_once()
+        assert pool.metrics()["recycled"] == 1
+
+    def test_exited_sandbox_is_not_reused(self, create_sandbox):
+        pool = SandboxPool(size=1, ttl=60)
+        first = pool.lease("hash-a", Mock())
+        pool.release(first)
+        first.poll.return_value = 137
+
+        assert pool.lease("hash-a", Mock()) is not first
+
+    def test_shutdown_terminates_idle_sandboxes(self, create_sandbox):
+        pool = SandboxPool(size=2, ttl=60)
+        sandboxes = [pool.lease("hash-a", Mock()) for _ in range(2)]
+        for sandbox in sandboxes:
+            pool.release(sandbox)
+
+        pool.shutdown()
+
+        for sandbox in sandboxes:
+            sandbox.terminate.assert_called_once()
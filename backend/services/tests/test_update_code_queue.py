@@ -0,0 +1,154 @@
+import json
+import time
+import pytest
+from unittest.mock import Mock, call, patch
+
+from backend.services import update_code_queue
+from backend.services.update_code_queue import (
+    UpdateCodeQueue, fail_queued_jobs, finish_merged_jobs, merge_update_prompts, start_merged_jobs,
+)
+
+
+class FakeRedisList:
+    """Just enough of a Redis list for the queue, pipelines run their commands right away"""
+
+    def __init__(self):
+        self.lists = {}
+        self.values = {}
+        self.results = []
+
+    def pipeline(self, transaction=True):
+        self.results = []
+        return self
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+        self.results.append(len(self.lists[key]))
+
+    def expire(self, key, ttl):
+        self.results.append(True)
+
+    def lrange(self, key, start, end):
+        self.results.append(list(self.lists.get(key, [])))
+
+    def delete(self, key):
+        removed = self.lists.pop(key, None) is not None or self.values.pop(key, None) is not None
+        self.results.append(int(removed))
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            self.results.append(None)
+            return
+        self.values[key] = value
+        self.results.append(True)
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def lindex(self, key, index):
+        values = self.lists.get(key, [])
+        return values[index] if values else None
+
+    def execute(self):
+        return self.results
+
+
+@pytest.fixture
+def redis():
+    redis = FakeRedisList()
+    with patch.object(update_code_queue, "get_redis_client", return_value=redis), \
+            patch.object(update_code_queue, "is_kv_configured", return_value=True):
+        yield redis
+
+
+class TestUpdateCodeQueue:
+    def test_only_first_prompt_schedules_a_run(self, redis):
+        queue = UpdateCodeQueue("project-1")
+
+        assert queue.push("job-1", "make it blue") == (True, True)
+        assert queue.push("job-2", "add a button") == (True, False)
+
+        jobs = queue.take_all()
+
+        assert [job["job_id"] for job in jobs] == ["job-1", "job-2"]
+        assert queue.is_empty()
+        assert queue.take_all() == []
+
+    def test_prompt_after_take_schedules_the_next_run(self, redis):
+        queue = UpdateCodeQueue("project-1")
+        queue.push("job-1", "make it blue")
+        queue.take_all()
+
+        assert queue.push("job-2", "add a button") == (True, True)
+
+    def test_queues_are_per_project(self, redis):
+        UpdateCodeQueue("project-1").push("job-1", "make it blue")
+
+        assert UpdateCodeQueue("project-2").take_all() == []
+
+    def test_runs_alone_when_redis_is_down(self):
+        redis = Mock()
+        redis.pipeline.side_effect = ConnectionError("down")
+        with patch.object(update_code_queue, "get_redis_client", return_value=redis), \
+                patch.object(update_code_queue, "is_kv_configured", return_value=True):
+            queue = UpdateCodeQueue("project-1")
+
+            assert queue.push("job-1", "make it blue") == (False, True)
+            assert queue.take_all() is None
+
+    def test_waits_until_prompts_stop_arriving(self, redis):
+        redis.lists["update-code:pending:project-1"] = [
+            json.dumps({"job_id": "job-1", "prompt": "x", "queued_at": time.time() - 0.5}),
+        ]
+
+        with patch.object(update_code_queue.time, "sleep") as sleep:
+            UpdateCodeQueue("project-1").wait_for_quiet(window=0.6, max_wait=10)
+
+        assert 0 < sleep.call_args_list[0].args[0] <= 0.1
+
+    def test_gives_up_waiting_after_max_wait(self, redis):
+        redis.lists["update-code:pending:project-1"] = [
+            json.dumps({"job_id": "job-1", "prompt": "x", "queued_at": time.time() + 60}),
+        ]
+
+        started = time.time()
+        UpdateCodeQueue("project-1").wait_for_quiet(window=10, max_wait=0.05)
+
+        assert time.time() - started < 1
+
+
+class TestMergedJobs:
+    def test_single_prompt_is_unchanged(self):
+        assert merge_update_prompts(["make it blue"]) == "make it blue"
+
+    def test_prompts_are_numbered_in_order(self):
+        merged = merge_update_prompts(["make it blue", "add a button"])
+
+        assert merged.index("1. make it blue") < merged.index("2. add a button")
+
+    def test_merged_jobs_share_the_outcome(self):
+        db = Mock()
+
+        start_merged_jobs(db, "job-1", ["job-2", "job-3"])
+        finish_merged_jobs(db, ["job-2", "job-3"], {"status": "error", "message": "build failed"})
+
+        assert db.update_job_status.call_args_list == [
+            call("job-2", "running"),
+            call("job-3", "running"),
+            call("job-2", "failed", "build failed"),
+            call("job-3", "failed", "build failed"),
+        ]
+
+    def test_successful_run_completes_merged_jobs(self):
+        db = Mock()
+
+        finish_merged_jobs(db, ["job-2"], {"status": "success"})
+
+        db.update_job_status.assert_called_once_with("job-2", "completed", None)
+
+    def test_failing_queued_jobs_only_touches_those_jobs(self):
+        db = Mock()
+
+        fail_queued_jobs(db, ["job-4"], "Timed out")
+
+        db.update_job_status.assert_called_once_with("job-4", "failed", "Timed out")
@@ -0,0 +1,128 @@
+"""
+Per-project queue of pending update_code prompts, so a burst of prompts shares one CodeService run
+"""
+import json
+import time
+from typing import Optional
+
+from backend import config
+from backend.integrations.db import Database
+from backend.integrations.kv import get_redis_client, is_kv_configured
+
+
+class UpdateCodeQueue:
+    """Prompts waiting for the project's next update_code run.
+
+    The webhook queues every prompt, but only spawns update_code if no run is scheduled for
+    the project yet. That run takes everything queued so far once it holds the project lock,
+    which also clears the schedule so the next prompt spawns the next run.
+    Fails open: if Redis is unavailable every job runs its own prompt.
+    """
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.key = f"update-code:pending:{project_id}"
+        self.scheduled_key = f"update-code:scheduled:{project_id}"
+
+    def push(self, job_id: str, prompt: str) -> tuple[bool, bool]:
+        """Queue a prompt, returns (queued, schedule_run).
+
+        schedule_run is True if the caller has to spawn a run, False if an already scheduled
+        run will pick the prompt up. A prompt that could not be queued has to run alone.
+        """
+        if not config.UPDATE_CODE_QUEUE["ENABLED"] or not is_kv_configured():
+            return False, True
+        entry = json.dumps({"job_id": job_id, "prompt": prompt, "queued_at": time.time()})
+        try:
+            # one transaction, so a run taking the queue either sees this prompt or leaves
+            # the schedule for it cleared
+            pipe = get_redis_client().pipeline(transaction=True)
+            pipe.rpush(self.key, entry)
+            pipe.expire(self.key, config.TIMEOUTS["PROJECT_SETUP"])
+            pipe.set(self.scheduled_key, job_id, nx=True, ex=_schedule_ttl())
+            _, _, scheduled = pipe.execute()
+            return True, bool(scheduled)
+        except Exception as e:
+            print(f"[update_code_queue] failed to queue job {job_id}, running it alone: {e}")
+            return False, True
+
+    def is_empty(self) -> bool:
+        try:
+            return not get_redis_client().llen(self.key)
+        except Exception as e:
+            print(f"[update_code_queue] failed to read queue of {self.project_id}: {e}")
+            return False
+
+    def wait_for_quiet(
+        self,
+        window: float = config.UPDATE_CODE_QUEUE["DEBOUNCE_WINDOW"],
+        max_wait: float = config.UPDATE_CODE_QUEUE["MAX_DEBOUNCE_WAIT"],
+    ):
+        """Sleep until no prompt was queued for window seconds, or max_wait has passed"""
+        deadline = time.time() + max_wait
+        while True:
+            try:
+                last = get_redis_client().lindex(self.key, -1)
+            except Exception as e:
+                print(f"[update_code_queue] failed to read queue of {self.project_id}: {e}")
+                return
+            if not last:
+                return
+            quiet_at = json.loads(last)["queued_at"] + window
+            now = time.time()
+            if now >= quiet_at or now >= deadline:
+                return
+            time.sleep(min(quiet_at, deadline) - now)
+
+    def take_all(self) -> Optional[list[dict]]:
+        """Remove and return every queued prompt, oldest first, and clear the schedule.
+
+        None if Redis is unavailable.
+        """
+        try:
+            pipe = get_redis_client().pipeline(transaction=True)
+            pipe.lrange(self.key, 0, -1)
+            pipe.delete(self.key)
+            pipe.delete(self.scheduled_key)
+            entries, _, _ = pipe.execute()
+        except Exception as e:
+            print(f"[update_code_queue] failed to take queue of {self.project_id}: {e}")
+            return None
+        return [json.loads(entry) for entry in entries]
+
+
+def _schedule_ttl() -> int:
+    """A scheduled run takes the queue at the latest after debouncing and waiting for the lock.
+
+    If it dies before that, the schedule expires and the next prompt spawns a new run.
+    """
+    return int(
+        config.UPDATE_CODE_QUEUE["MAX_DEBOUNCE_WAIT"] + config.PROJECT_LOCK["WAIT_TIMEOUT"] + 60
+    )
+
+
+def merge_update_prompts(prompts: list[str]) -> str:
+    if len(prompts) == 1:
+        return prompts[0]
+    requests = "\n\n".join(f"{i}. {prompt}" for i, prompt in enumerate(prompts, start=1))
+    return f"Apply all of these changes, requested one after another. If they conflict, the later request wins:\n\n{requests}"
+
+
+def start_merged_jobs(db: Database, primary_job_id: str, job_ids: list[str]):
+    """Mark jobs whose prompts run as part of primary_job_id's run as running"""
+    for job_id in job_ids:
+        db.add_log(job_id, "system", f"Merged into job {primary_job_id} with {len(job_ids)} other prompt(s)")
+        db.update_job_status(job_id, "running")
+
+
+def fail_queued_jobs(db: Database, job_ids: list[str], error: str):
+    """Fail jobs whose prompts were taken from the queue but never ran"""
+    for job_id in job_ids:
+        db.update_job_status(job_id, "failed", error)
+
+
+def finish_merged_jobs(db: Database, job_ids: list[str], result: dict):
+    """Give merged jobs the outcome of the run they were part of"""
+    status = "completed" if result.get("status") == "success" else "failed"
+    for job_id in job_ids:
+        db.update_job_status(job_id, status, None if status == "completed" else result.get("message"))
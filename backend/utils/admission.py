@@ -0,0 +1,64 @@
+"""
+Admission control for the entry points that start sandbox and LLM heavy jobs
+"""
+import math
+import uuid
+from typing import Optional
+
+from backend.config import ADMISSION, TIMEOUTS
+from backend.integrations.kv import acquire_slot, is_kv_configured, release_slot, take_tokens
+
+ACTIVE_JOBS_KEY = "admission:active-jobs"
+
+
+def _bucket(bucket_config: dict) -> tuple[float, float]:
+    return bucket_config["CAPACITY"], bucket_config["REFILL_PER_HOUR"] / 3600
+
+
+def admit_job(fid) -> dict:
+    """Reserve a job slot and take a token from the user's and the global bucket.
+
+    Returns {"admitted": True, "slot": ...}, the slot is passed on to the job which frees it
+    with release_job_slot. Otherwise {"admitted": False, "reason": ..., "retry_after": seconds}.
+    """
+    if not ADMISSION["ENABLED"] or not is_kv_configured():
+        return {"admitted": True, "slot": None}
+
+    slot = str(uuid.uuid4())
+    # a job that dies without releasing its slot holds it at most for the job timeout
+    if not acquire_slot(ACTIVE_JOBS_KEY, slot, ADMISSION["MAX_ACTIVE_JOBS"], TIMEOUTS["PROJECT_SETUP"]):
+        return {
+            "admitted": False,
+            "reason": "Too many jobs are running, please try again shortly",
+            "retry_after": ADMISSION["QUEUE_FULL_RETRY_AFTER"],
+        }
+
+    retry_after = take_tokens({
+        f"admission:bucket:fid:{fid}": _bucket(ADMISSION["USER_BUCKET"]),
+        "admission:bucket:global": _bucket(ADMISSION["GLOBAL_BUCKET"]),
+    })
+    if retry_after:
+        release_slot(ACTIVE_JOBS_KEY, slot)
+        return {
+            "admitted": False,
+            "reason": "Too many requests, please slow down",
+            "retry_after": math.ceil(retry_after),
+        }
+
+    return {"admitted": True, "slot": slot}
+
+
+def release_job_slot(slot: Optional[str]):
+    if slot:
+        release_slot(ACTIVE_JOBS_KEY, slot)
+
+
+def too_many_requests(admission: dict):
+    """429 response with a Retry-After header for a rejected admission"""
+    from fastapi.responses import JSONResponse
+
+    return JSONResponse(
+        status_code=429,
+        content={"error": admission["reason"], "retry_after": admission["retry_after"]},
+        headers={"Retry-After": str(admission["retry_after"])},
+    )
@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Optional
+
+
+class StageGraph:
+    """Runs named stages in threads as soon as the stages they depend on have finished.
+
+    Independent stages overlap. If a stage fails, no further stages are started, on_error
+    is called right away and `cancelled` is set, so long running stages can stop early.
+    The error is raised once the stages that are already running have finished.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ):
+        self.max_workers = max_workers
+        self.on_error = on_error
+        self.cancelled = threading.Event()
+        self._stages: dict[str, tuple[Callable[[], Any], tuple[str, ...]]] = {}
+
+    def add(self, name: str, fn: Callable[[], Any], depends_on: Iterable[str] = ()) -> "StageGraph":
+        depends_on = tuple(depends_on)
+        unknown = [dependency for dependency in depends_on if dependency not in self._stages]
+        if unknown:
+            # stages must be added after their dependencies, which also rules out cycles
+            raise ValueError(f"Stage {name} depends on unknown stages {unknown}")
+        self._stages[name] = (fn, depends_on)
+        return self
+
+    def run(self) -> dict[str, Any]:
+        """Run every stage, returns the result of each stage by name"""
+        results: dict[str, Any] = {}
+        pending = dict(self._stages)
+        running: dict[Future, str] = {}
+        started_at: dict[str, float] = {}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        try:
+            while pending or running:
+                for name, (fn, depends_on) in list(pending.items()):
+                    if all(dependency in results for dependency in depends_on):
+                        del pending[name]
+                        started_at[name] = time.time()
+                        running[executor.submit(fn)] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        self._fail(name, e, list(running.values()))
+                        raise
+                    print(f"[stage_graph] {name} finished in {time.time() - started_at[name]:.1f}s")
+        finally:
+            # stages may hold resources (sandboxes, locks) the caller has to clean up
+            executor.shutdown(wait=True, cancel_futures=True)
+        return results
+
+    def _fail(self, name: str, error: Exception, still_running: list[str]):
+        print(f"[stage_graph] {name} failed, cancelling {still_running}: {error}")
+        self.cancelled.set()
+        if self.on_error:
+            try:
+                self.on_error(name, error)
+            except Exception as e:
+                print(f"[stage_graph] error handler for {name} failed: {e}")
@@ -2,64 +2,109 @@ import re
 import modal
 import json
 import os
+import threading
+from collections import deque
+from typing import Callable, Optional
 from packaging.version import Version
 
-def parse_sandbox_process(process, prefix="") -> tuple[list, int]:
-    """Safely parse stdout/stderr from a sandbox process using Modal's StreamReader."""
-    logs = []
-    exit_code = -1
+from backend import config
+
+
+class ProcessOutput:
+    """Output of a sandbox process: the most recent lines, plus a count of everything seen"""
+
+    def __init__(self, max_lines: Optional[int], prefix: str = ""):
+        self.lines = deque(maxlen=max_lines)
+        self.line_count = 0
+        self.prefix = prefix
+        self._lock = threading.Lock()
+
+    def append(self, line: str):
+        with self._lock:
+            self.lines.append(line)
+            self.line_count += 1
 
+
+def _decode_process_line(line) -> str:
+    if isinstance(line, bytes):
+        # Use 'replace' instead of 'ignore' to handle bad bytes
+        return line.decode("utf-8", "replace").strip()
+    return str(line).strip()
+
+
+def _drain_stream(stream, stream_name: str, output: ProcessOutput, on_line: Optional[Callable[[str, str], None]]):
     try:
-        # Handle stdout with more robust error handling
-        for line in process.stdout:
+        for line in stream:
             try:
-                if isinstance(line, bytes):
-                    # Use 'replace' instead of 'ignore' to handle bad bytes
-                    decoded = line.decode("utf-8", "replace").strip()
-                else:
-                    decoded = str(line).strip()
-                logs.append(decoded)
-                print(f"[{prefix}] {decoded}")
-            except UnicodeDecodeError as ude:
-                error_msg = f"Decode error: {str(ude)}"
-                logs.append(error_msg)
-                print(f"[{prefix} ERR] {error_msg}")
+                decoded = _decode_process_line(line)
             except Exception as e:
-                error_msg = f"Unexpected error processing stdout: {str(e)}"
-                logs.append(error_msg)
-                print(f"[{prefix} ERR] {error_msg}")
+                decoded = f"Unexpected error processing {stream_name}: {str(e)}"
+            output.append(decoded)
+            if on_line:
+                try:
+                    on_line(stream_name, decoded)
+                except Exception as e:
+                    print(f"[{output.prefix} ERR] line callback failed: {str(e)}")
+    except Exception as e:
+        output.append(f"Error reading {stream_name}: {str(e)}")
 
-        # Handle stderr with more robust error handling
-        for line in process.stderr:
-            try:
-                if isinstance(line, bytes):
-                    # Use 'replace' instead of 'ignore' to handle bad bytes
-                    decoded = line.decode("utf-8", "replace").strip()
-                else:
-                    decoded = str(line).strip()
-                logs.append(decoded)
-                print(f"[{prefix} ERR] {decoded}")
-            except UnicodeDecodeError as ude:
-                error_msg = f"Decode error: {str(ude)}"
-                logs.append(error_msg)
-                print(f"[{prefix} ERR] {error_msg}")
-            except Exception as e:
-                error_msg = f"Unexpected error processing stderr: {str(e)}"
-                logs.append(error_msg)
-                print(f"[{prefix} ERR] {error_msg}")
 
-        # Get exit code after reading all output
-        try:
-            exit_code = process.wait()
-        except Exception as e:
-            error_msg = f"Error getting exit code: {str(e)}"
-            logs.append(error_msg)
-            print(f"[{prefix} ERR] {error_msg}")
+def stream_sandbox_process(
+    process,
+    prefix: str = "",
+    on_line: Optional[Callable[[str, str], None]] = None,
+    max_lines: Optional[int] = config.PROCESS_OUTPUT["MAX_LINES"],
+) -> tuple[ProcessOutput, int]:
+    """
+    Drain stdout and stderr of a sandbox process concurrently until it exits.
+
+    Args:
+        process: Sandbox process from sandbox.exec
+        prefix: Label for log output
+        on_line: Called with ("stdout" | "stderr", line) for every line as it arrives, use it
+            to forward the full log, e.g. to the job logs
+        max_lines: Lines kept in memory, None keeps everything
+
+    Returns:
+        Tuple of (ProcessOutput, exit_code)
+    """
+    output = ProcessOutput(max_lines, prefix)
+    exit_code = -1
 
+    readers = [
+        threading.Thread(
+            target=_drain_stream, args=(stream, name, output, on_line), daemon=True
+        )
+        for name, stream in (("stdout", process.stdout), ("stderr", process.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    try:
+        exit_code = process.wait()
     except Exception as e:
-        error_msg = f"Process handling failed. exit code: {exit_code} error: {str(e)}"
-        logs.append(error_msg)
-        print(f"[{prefix} CRITICAL] {error_msg}")
+        output.append(f"Error getting exit code: {str(e)}")
+
+    dropped = output.line_count - len(output.lines)
+    kept = f", kept the last {len(output.lines)}" if dropped else ""
+    print(f"[{prefix}] process exited with code {exit_code} after {output.line_count} lines{kept}")
+    return output, exit_code
+
+
+def parse_sandbox_process(
+    process,
+    prefix="",
+    on_line: Optional[Callable[[str, str], None]] = None,
+    max_lines: Optional[int] = config.PROCESS_OUTPUT["MAX_LINES"],
+) -> tuple[list, int]:
+    """Safely parse stdout/stderr from a sandbox process using Modal's StreamReader.
+
+    Returns the last max_lines lines of combined output and the exit code.
+    """
+    output, exit_code = stream_sandbox_process(process, prefix, on_line, max_lines)
+    logs = list(output.lines)
 
     if not logs:
         # Add a placeholder if logs are empty to prevent further issues
@@ -67,6 +112,29 @@ def parse_sandbox_process(process, prefix="") -> tuple[list, int]:
 
     return logs, exit_code
 
+def parse_pnpm_store_stats(logs: list[str]) -> Optional[dict]:
+    """
+    Extract package store usage from the final pnpm progress line, e.g.
+    "Progress: resolved 1190, reused 1164, downloaded 26, added 1190, done"
+
+    Returns:
+        Dict with resolved, reused, downloaded counts and store hit_rate, or None if pnpm printed no progress
+    """
+    for line in reversed(logs):
+        match = re.search(r"Progress: resolved (\d+), reused (\d+), downloaded (\d+)", line)
+        if not match:
+            continue
+
+        resolved, reused, downloaded = (int(value) for value in match.groups())
+        fetched = reused + downloaded
+        return {
+            "resolved": resolved,
+            "reused": reused,
+            "downloaded": downloaded,
+            "hit_rate": reused / fetched if fetched else 1.0,
+        }
+    return None
+
 def handle_package_install_commands(
     aider_result: str,
     sandbox: modal.Sandbox,
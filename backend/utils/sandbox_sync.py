@@ -0,0 +1,116 @@
+import hashlib
+import io
+import os
+import tarfile
+
+# Installed inside the sandbox, never uploaded from the local working copy
+SYNC_EXCLUDED_DIRS = {"node_modules", ".next"}
+
+# Written into the sync tar, lists NUL-separated paths the sandbox should delete
+DELETED_PATHS_FILE = ".repo-sync-deleted"
+
+STDIN_CHUNK_SIZE = 1024 * 1024
+
+
+def get_local_manifest(repo_dir: str) -> dict[str, str]:
+    """sha1 of every regular file in the working copy (incl. .git), keyed by ./relative path"""
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(repo_dir):
+        dirnames[:] = [name for name in dirnames if name not in SYNC_EXCLUDED_DIRS]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            manifest["./" + os.path.relpath(path, repo_dir)] = digest
+    return manifest
+
+
+def get_sandbox_manifest(sandbox, remote_dir: str = "/repo") -> dict[str, str]:
+    """sha1 of every regular file the sandbox currently has under remote_dir"""
+    pruned = " -o ".join(f"-name {name}" for name in sorted(SYNC_EXCLUDED_DIRS))
+    process = sandbox.exec(
+        "bash", "-c",
+        f"cd {remote_dir} && find . \\( {pruned} \\) -prune -o -type f -print0 | xargs -0 -r sha1sum",
+    )
+    output = process.stdout.read()
+    process.wait()
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", "replace")
+
+    manifest = {}
+    for line in output.splitlines():
+        digest, _, path = line.partition("  ")
+        if path:
+            manifest[path] = digest
+    return manifest
+
+
+def diff_manifests(local: dict[str, str], remote: dict[str, str]) -> tuple[list[str], list[str]]:
+    """Paths to upload (new or changed) and paths to delete in the sandbox"""
+    changed = sorted(path for path, digest in local.items() if remote.get(path) != digest)
+    deleted = sorted(path for path in remote if path not in local)
+    return changed, deleted
+
+
+def _list_symlinks(repo_dir: str) -> list[str]:
+    symlinks = []
+    for dirpath, dirnames, filenames in os.walk(repo_dir):
+        dirnames[:] = [name for name in dirnames if name not in SYNC_EXCLUDED_DIRS]
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path):
+                symlinks.append("./" + os.path.relpath(path, repo_dir))
+    return symlinks
+
+
+def build_sync_tar(repo_dir: str, changed: list[str], deleted: list[str]) -> bytes:
+    """One tar stream with the changed files plus the list of deleted paths"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        # symlinks are not part of the manifests, so always send them
+        for path in changed + _list_symlinks(repo_dir):
+            tar.add(os.path.join(repo_dir, path), arcname=path, recursive=False)
+        if deleted:
+            payload = b"\0".join(path.encode() for path in deleted)
+            info = tarfile.TarInfo(DELETED_PATHS_FILE)
+            info.size = len(payload)
+            tar.addfile(info, io.BytesIO(payload))
+    return buffer.getvalue()
+
+
+def write_stdin_to_sandbox_process(sandbox, data: bytes, *command: str) -> int:
+    """Run a command in the sandbox with data streamed to its stdin, returns the exit code"""
+    process = sandbox.exec(*command)
+    for start in range(0, len(data), STDIN_CHUNK_SIZE):
+        process.stdin.write(data[start:start + STDIN_CHUNK_SIZE])
+        process.stdin.drain()
+    process.stdin.write_eof()
+    process.stdin.drain()
+    return process.wait()
+
+
+def sync_repo_to_sandbox(sandbox, repo_dir: str, remote_dir: str = "/repo") -> dict:
+    """Make the sandbox's repo match the local working tree, sending only what differs.
+
+    Installed dependencies (node_modules, .next) in the sandbox are left untouched.
+    Returns the changed and deleted ./relative paths, their counts and the size of the transfer.
+    """
+    changed, deleted = diff_manifests(
+        get_local_manifest(repo_dir), get_sandbox_manifest(sandbox, remote_dir)
+    )
+    data = build_sync_tar(repo_dir, changed, deleted)
+
+    apply_script = (
+        f"cd {remote_dir} && tar -xf - && "
+        f"if [ -f {DELETED_PATHS_FILE} ]; then "
+        f"xargs -0 -r rm -f -- < {DELETED_PATHS_FILE}; rm -f {DELETED_PATHS_FILE}; fi"
+    )
+    exit_code = write_stdin_to_sandbox_process(sandbox, data, "bash", "-c", apply_script)
+    if exit_code != 0:
+        raise RuntimeError(f"Syncing repo into sandbox failed with exit code {exit_code}")
+
+    stats = {"changed": len(changed), "deleted": len(deleted), "bytes": len(data)}
+    print(f"[sandbox_sync] synced into {remote_dir}: {stats}")
+    return {**stats, "changed_paths": changed, "deleted_paths": deleted}
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+
+from backend.utils import admission
+from backend.utils.admission import ACTIVE_JOBS_KEY, admit_job, release_job_slot
+
+
+class TestAdmitJob(unittest.TestCase):
+    def setUp(self):
+        for name, value in [("is_kv_configured", True), ("acquire_slot", True), ("take_tokens", 0)]:
+            patcher = patch.object(admission, name, return_value=value)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(admission, "release_slot")
+        self.release_slot = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_admitted_job_gets_a_slot(self):
+        result = admit_job(42)
+
+        self.assertTrue(result["admitted"])
+        self.assertIsNotNone(result["slot"])
+        buckets = self.take_tokens.call_args.args[0]
+        self.assertEqual(set(buckets), {"admission:bucket:fid:42", "admission:bucket:global"})
+
+    def test_rate_limited_user_gives_the_slot_back(self):
+        self.take_tokens.return_value = 90.2
+
+        result = admit_job(42)
+
+        self.assertEqual(result["admitted"], False)
+        self.assertEqual(result["retry_after"], 91)
+        self.release_slot.assert_called_once()
+
+    def test_full_queue_does_not_take_tokens(self):
+        self.acquire_slot.return_value = False
+
+        result = admit_job(42)
+
+        self.assertEqual(result["admitted"], False)
+        self.assertEqual(result["retry_after"], admission.ADMISSION["QUEUE_FULL_RETRY_AFTER"])
+        self.take_tokens.assert_not_called()
+
+    def test_admits_everything_without_kv(self):
+        self.is_kv_configured.return_value = False
+
+        self.assertEqual(admit_job(42), {"admitted": True, "slot": None})
+        self.acquire_slot.assert_not_called()
+
+    def test_release_ignores_missing_slot(self):
+        release_job_slot(None)
+        release_job_slot("slot-1")
+
+        self.release_slot.assert_called_once_with(ACTIVE_JOBS_KEY, "slot-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+
+from backend.utils.dag import StageGraph
+
+
+class TestStageGraph(unittest.TestCase):
+    def test_dependencies_run_first(self):
+        order = []
+        graph = StageGraph()
+        graph.add("repo", lambda: order.append("repo"))
+        graph.add("vercel", lambda: order.append("vercel"), depends_on=["repo"])
+        graph.add("commit", lambda: order.append("commit"), depends_on=["vercel"])
+
+        graph.run()
+
+        self.assertEqual(order, ["repo", "vercel", "commit"])
+
+    def test_independent_stages_overlap(self):
+        both_running = threading.Barrier(2, timeout=5)
+        graph = StageGraph()
+        graph.add("docs", both_running.wait)
+        graph.add("repo", both_running.wait)
+
+        # a sequential runner would break the barrier and raise
+        graph.run()
+
+    def test_returns_stage_results(self):
+        graph = StageGraph()
+        graph.add("name", lambda: "my-frame")
+
+        self.assertEqual(graph.run(), {"name": "my-frame"})
+
+    def test_failure_stops_dependents_and_waits_for_running_stages(self):
+        finished = []
+
+        def slow():
+            time.sleep(0.2)
+            finished.append("slow")
+
+        def fail():
+            raise RuntimeError("repo creation failed")
+
+        graph = StageGraph()
+        graph.add("slow", slow)
+        graph.add("repo", fail)
+        graph.add("vercel", lambda: finished.append("vercel"), depends_on=["repo"])
+
+        with self.assertRaises(RuntimeError):
+            graph.run()
+        self.assertEqual(finished, ["slow"])
+
+    def test_failure_reported_and_cancelled_before_running_stages_finish(self):
+        events = []
+
+        def long_stage():
+            for _ in range(50):
+                if graph.cancelled.wait(timeout=0.1):
+                    events.append("docs cancelled")
+                    return
+
+        def fail():
+            raise RuntimeError("repo creation failed")
+
+        graph = StageGraph(on_error=lambda name, error: events.append(f"{name} failed: {error}"))
+        graph.add("docs", long_stage)
+        graph.add("repo", fail)
+
+        started_at = time.time()
+        with self.assertRaises(RuntimeError):
+            graph.run()
+
+        self.assertLess(time.time() - started_at, 1)
+        self.assertCountEqual(events, ["repo failed: repo creation failed", "docs cancelled"])
+
+    def test_unknown_dependency_rejected(self):
+        with self.assertRaises(ValueError):
+            StageGraph().add("vercel", lambda: None, depends_on=["repo"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,10 @@
 import re
+import threading
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 import modal
 
-from backend.utils.package_commands import handle_package_install_commands, parse_sandbox_process
+from backend.utils.package_commands import handle_package_install_commands, parse_sandbox_process, parse_pnpm_store_stats, stream_sandbox_process
 
 class TestPackageCommands(unittest.TestCase):
     def setUp(self):
@@ -153,5 +154,92 @@ class TestPackageCommands(unittest.TestCase):
         self.mock_parse_process.assert_not_called()
 
 
+class TestParsePnpmStoreStats(unittest.TestCase):
+    def test_uses_final_progress_line(self):
+        logs = [
+            "Lockfile is up to date, resolution step is skipped",
+            "Progress: resolved 1, reused 0, downloaded 0, added 0",
+            "Progress: resolved 1190, reused 1164, downloaded 26, added 1190, done",
+            "Done in 12.3s",
+        ]
+
+        stats = parse_pnpm_store_stats(logs)
+
+        self.assertEqual(stats["resolved"], 1190)
+        self.assertEqual(stats["reused"], 1164)
+        self.assertEqual(stats["downloaded"], 26)
+        self.assertAlmostEqual(stats["hit_rate"], 1164 / 1190)
+
+    def test_nothing_fetched_counts_as_full_hit(self):
+        stats = parse_pnpm_store_stats(["Progress: resolved 10, reused 0, downloaded 0, added 0, done"])
+
+        self.assertEqual(stats["hit_rate"], 1.0)
+
+    def test_no_progress_output(self):
+        self.assertIsNone(parse_pnpm_store_stats(["Already up to date"]))
+
+
+class TestParseSandboxProcess(unittest.TestCase):
+    def _process(self, stdout, stderr, exit_code=0):
+        process = Mock()
+        process.stdout = stdout
+        process.stderr = stderr
+        process.wait.return_value = exit_code
+        return process
+
+    def test_collects_both_streams(self):
+        process = self._process([b"built\n", "done"], [b"warning: \xff\n"], exit_code=1)
+
+        logs, exit_code = parse_sandbox_process(process)
+
+        self.assertEqual(exit_code, 1)
+        self.assertCountEqual(logs, ["built", "done", "warning: \ufffd"])
+
+    def test_stderr_read_while_stdout_blocks(self):
+        stderr_read = threading.Event()
+
+        def stdout():
+            # a serial reader would deadlock here: stdout only ends after stderr was drained
+            self.assertTrue(stderr_read.wait(timeout=5))
+            yield "stdout line"
+
+        def stderr():
+            yield "stderr line"
+            stderr_read.set()
+
+        logs, _ = parse_sandbox_process(self._process(stdout(), stderr()))
+
+        self.assertEqual(logs, ["stderr line", "stdout line"])
+
+    def test_keeps_bounded_tail(self):
+        lines = [f"line {i}" for i in range(10)]
+        forwarded = []
+
+        output, _ = stream_sandbox_process(
+            self._process(lines, []), prefix="build", max_lines=3,
+            on_line=lambda stream, line: forwarded.append(line),
+        )
+
+        self.assertEqual(list(output.lines), ["line 7", "line 8", "line 9"])
+        self.assertEqual(output.line_count, 10)
+        self.assertEqual(forwarded, lines)
+
+    def test_forwards_lines_to_callback(self):
+        received = []
+
+        parse_sandbox_process(
+            self._process(["out"], ["err"]),
+            on_line=lambda stream, line: received.append((stream, line)),
+        )
+
+        self.assertCountEqual(received, [("stdout", "out"), ("stderr", "err")])
+
+    def test_empty_output_placeholder(self):
+        logs, exit_code = parse_sandbox_process(self._process([], []))
+
+        self.assertEqual(logs, ["No output captured from process"])
+        self.assertEqual(exit_code, 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,117 @@
+import os
+import subprocess
+import unittest
+import tempfile
+
+from backend.utils.sandbox_sync import (
+    diff_manifests,
+    get_local_manifest,
+    sync_repo_to_sandbox,
+)
+
+
+class LocalProcess:
+    """Mimics a Modal sandbox process on top of a local subprocess"""
+
+    def __init__(self, *command):
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.stdin = self
+        self.stdout = self
+
+    def write(self, data):
+        self._process.stdin.write(data)
+
+    def drain(self):
+        if not self._process.stdin.closed:
+            self._process.stdin.flush()
+
+    def write_eof(self):
+        self._process.stdin.close()
+
+    def read(self):
+        return self._process.stdout.read()
+
+    def wait(self):
+        return self._process.wait()
+
+
+class LocalSandbox:
+    def exec(self, *command):
+        return LocalProcess(*command)
+
+
+def _write(directory, path, content):
+    full_path = os.path.join(directory, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as f:
+        f.write(content)
+
+
+class TestDiffManifests(unittest.TestCase):
+    def test_reports_new_changed_and_deleted_paths(self):
+        local = {"./a": "1", "./b": "2-new", "./c": "3"}
+        remote = {"./a": "1", "./b": "2-old", "./d": "4"}
+
+        changed, deleted = diff_manifests(local, remote)
+
+        self.assertEqual(changed, ["./b", "./c"])
+        self.assertEqual(deleted, ["./d"])
+
+
+class TestSyncRepoToSandbox(unittest.TestCase):
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp()
+        self.remote_dir = tempfile.mkdtemp()
+        self.sandbox = LocalSandbox()
+
+    def _sync(self):
+        return sync_repo_to_sandbox(self.sandbox, self.local_dir, remote_dir=self.remote_dir)
+
+    def test_first_sync_uploads_everything(self):
+        _write(self.local_dir, "src/app.tsx", "app")
+        _write(self.local_dir, ".git/HEAD", "ref: refs/heads/main")
+
+        stats = self._sync()
+
+        self.assertEqual(stats["changed"], 2)
+        self.assertEqual(get_local_manifest(self.remote_dir), get_local_manifest(self.local_dir))
+
+    def test_second_sync_sends_only_the_changed_file(self):
+        _write(self.local_dir, "src/app.tsx", "app")
+        _write(self.local_dir, "src/other.tsx", "other")
+        self._sync()
+
+        _write(self.local_dir, "src/app.tsx", "app v2")
+        stats = self._sync()
+
+        self.assertEqual(stats["changed"], 1)
+        self.assertEqual(stats["deleted"], 0)
+        self.assertEqual(stats["changed_paths"], ["./src/app.tsx"])
+        with open(os.path.join(self.remote_dir, "src/app.tsx")) as f:
+            self.assertEqual(f.read(), "app v2")
+
+    def test_removes_stale_files_but_keeps_node_modules(self):
+        _write(self.local_dir, "src/app.tsx", "app")
+        _write(self.remote_dir, "src/from-previous-project.tsx", "stale")
+        _write(self.remote_dir, "node_modules/next/package.json", "{}")
+
+        stats = self._sync()
+
+        self.assertEqual(stats["deleted"], 1)
+        self.assertEqual(stats["deleted_paths"], ["./src/from-previous-project.tsx"])
+        self.assertFalse(os.path.exists(os.path.join(self.remote_dir, "src/from-previous-project.tsx")))
+        self.assertTrue(os.path.exists(os.path.join(self.remote_dir, "node_modules/next/package.json")))
+        self.assertFalse(os.path.exists(os.path.join(self.remote_dir, ".repo-sync-deleted")))
+
+    def test_local_node_modules_are_never_uploaded(self):
+        _write(self.local_dir, "node_modules/left-over/index.js", "x")
+        _write(self.local_dir, "package.json", "{}")
+
+        stats = self._sync()
+
+        self.assertEqual(stats["changed"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.remote_dir, "node_modules")))
+
+
+if __name__ == "__main__":
+    unittest.main()
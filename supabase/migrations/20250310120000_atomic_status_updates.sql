@@ -0,0 +1,40 @@
+-- Status updates merge the error into the jsonb data column server-side,
+-- so a status change is a single round-trip and concurrent writers can't
+-- overwrite each other's data keys.
+
+ALTER TABLE public.builds ADD COLUMN IF NOT EXISTS data jsonb;
+
+CREATE OR REPLACE FUNCTION public.set_job_status(
+  p_job_id uuid,
+  p_status text,
+  p_error text DEFAULT NULL
+) RETURNS void
+LANGUAGE sql
+AS $$
+  UPDATE public.jobs
+  SET status = p_status,
+      data = CASE
+        WHEN p_error IS NULL THEN data
+        ELSE coalesce(data, '{}'::jsonb) || jsonb_build_object('error', p_error)
+      END
+  WHERE id = p_job_id;
+$$;
+
+CREATE OR REPLACE FUNCTION public.set_build_status(
+  p_build_id uuid,
+  p_status text,
+  p_error text DEFAULT NULL
+) RETURNS void
+LANGUAGE sql
+AS $$
+  UPDATE public.builds
+  SET status = p_status,
+      data = CASE
+        WHEN p_error IS NULL THEN data
+        ELSE coalesce(data, '{}'::jsonb) || jsonb_build_object('error', p_error)
+      END
+  WHERE id = p_build_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.set_job_status(uuid, text, text) TO service_role;
+GRANT EXECUTE ON FUNCTION public.set_build_status(uuid, text, text) TO service_role;
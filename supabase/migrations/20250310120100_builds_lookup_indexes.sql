@@ -0,0 +1,11 @@
+-- Latest-build and build-by-commit lookups are per project; index them so
+-- their cost stays flat as a project's build history grows.
+
+ALTER TABLE public.builds ADD COLUMN IF NOT EXISTS commit_hash text;
+ALTER TABLE public.builds ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS builds_project_id_created_at_idx
+  ON public.builds (project_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS builds_project_id_commit_hash_idx
+  ON public.builds (project_id, commit_hash);